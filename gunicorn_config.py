@@ -1,2 +1,11 @@
+import sys
+
 bind = "0.0.0.0:8050"
 workers = 2
+
+
+def post_worker_init(worker):
+    """Starts the background threads of the dashboard once the worker has loaded it"""
+    dashboard = sys.modules.get("src.apps.tco2_dashboard.app")
+    if dashboard is not None:
+        dashboard.start_refresher()
@@ -0,0 +1,47 @@
+"""Checks that the credits aggregations answered from a rollup cube return the same results as the
+aggregations of the credits, and compares their latencies (p50 and p99).
+Both sides start from a copy of their cached input, like when they are read from the cache.
+
+Usage: python -m scripts.benchmark_rollup [rows] [projects] [runs]
+"""
+import sys
+import time
+import numpy as np
+from src.apps.services import Credits
+from tests.summaries import projects_credits_df, rollup_aggregations, compare, ROLLUP_DATE_COLUMN
+
+
+def latencies(func, source, runs: int):
+    """Returns the p50 and p99 latencies in ms of func applied to copies of source"""
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        func(source.copy())
+        times.append((time.perf_counter() - started) * 1000)
+    return np.percentile(times, 50), np.percentile(times, 99)
+
+
+def main(rows: int, projects: int, runs: int):
+    credits = Credits()
+    df = projects_credits_df(rows, projects)
+    started = time.perf_counter()
+    cubes = {dated: credits.rollup(df, ROLLUP_DATE_COLUMN if dated else None) for dated in [False, True]}
+    print(
+        f"cubes built in {(time.perf_counter() - started) * 1000:.0f} ms: {len(df)} credits of {projects} projects, "
+        f"{len(cubes[False])} rows without date, {len(cubes[True])} rows by day"
+    )
+    print(f"{'aggregation':<14} {'credits p50':>12} {'p99':>8} {'cube p50':>10} {'p99':>8}   (ms)")
+    for name, aggregate, aggregate_cube, dated in rollup_aggregations(credits):
+        cube = cubes[dated]
+        compare(aggregate(df.copy()), aggregate_cube(cube.copy()))
+        before = latencies(aggregate, df, runs)
+        after = latencies(aggregate_cube, cube, runs)
+        print(f"{name:<14} {before[0]:>12.1f} {before[1]:>8.1f} {after[0]:>10.1f} {after[1]:>8.1f}")
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 200000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 2000,
+        int(sys.argv[3]) if len(sys.argv) > 3 else 50,
+    )
@@ -0,0 +1,119 @@
+"""Checks that the vectorized summaries of the services return the same results as their previous
+per group implementations, and compares their speed.
+
+Usage: python -m scripts.benchmark_summaries [rows]
+Datasets used as references, like the tokens, are synthetic and read from a temporary local storage.
+"""
+import os
+import sys
+import tempfile
+import timeit
+from contextlib import contextmanager
+from flask import Flask
+from prefect.results import PersistedResultBlob
+from src.util import DfSerializer
+from src.apps.services import cache, Credits, Retirements, Pools
+from tests.summaries import (
+    credits_df, credits_groupings, retirements_df, tokens_df, pools_df, compare,
+    legacy_pool_summary, legacy_bridge_summary, legacy_token_summary, legacy_origin_summary, legacy_pools_summary
+)
+
+
+@contextmanager
+def offline_app(datasets: dict):
+    """An application context whose services read the datasets, indexed by slug, from a temporary local storage
+    and use empty caches stored next to it"""
+    with tempfile.TemporaryDirectory() as path:
+        serializer = DfSerializer()
+        for slug, df in datasets.items():
+            blob = PersistedResultBlob(serializer=serializer, data=serializer.dumps(df))
+            with open(os.path.join(path, f"{slug}-latest"), "wb") as f:
+                f.write(blob.to_bytes())
+        previous_storage = os.environ.get("DASH_USE_LOCAL_STORAGE")
+        os.environ["DASH_USE_LOCAL_STORAGE"] = path
+        app = Flask(__name__)
+        for name, services_cache in [
+            ("layout", cache.layout_cache),
+            ("services", cache.services_long_cache),
+            ("services_short", cache.services_short_cache),
+        ]:
+            services_cache.init_app(app, config={"CACHE_DIR": os.path.join(path, "cache", name)})
+        try:
+            with app.app_context():
+                yield app
+        finally:
+            if previous_storage is None:
+                del os.environ["DASH_USE_LOCAL_STORAGE"]
+            else:
+                os.environ["DASH_USE_LOCAL_STORAGE"] = previous_storage
+
+
+def cases(rows: int):
+    """Yields (name, legacy implementation, vectorized implementation).
+    The pools summaries use the tokens of tokens_df: they must be the ones of the storage"""
+    credits = Credits()
+    df = credits_df(rows)
+    groupings = credits_groupings(credits, df)
+    for name, grouping in groupings.items():
+        yield (
+            f"pool_summary/{name}",
+            lambda grouping=grouping: legacy_pool_summary(*grouping()),
+            lambda grouping=grouping: Credits.pool_summary.func(credits, *grouping()),
+        )
+    groupings["all"] = lambda: (df, "quantity")
+    for name, grouping in groupings.items():
+        yield (
+            f"bridge_summary/{name}",
+            lambda grouping=grouping: legacy_bridge_summary(*grouping()),
+            lambda grouping=grouping: Credits.bridge_summary.func(credits, *grouping()),
+        )
+
+    retirements = Retirements()
+    retirements_by_freq = {
+        freq: retirements.date_manipulations(retirements_df(rows), "retirement_date", freq)
+        for freq in ["daily", "monthly"]
+    }
+    for freq, freq_df in retirements_by_freq.items():
+        def grouping(freq_df=freq_df):
+            return freq_df.groupby(["retirement_date"], group_keys=False, observed=True)
+        yield (
+            f"token_summary/{freq}",
+            lambda grouping=grouping: legacy_token_summary(grouping()),
+            lambda grouping=grouping: Retirements.token_summary.func(retirements, grouping()),
+        )
+        yield (
+            f"origin_summary/{freq}",
+            lambda grouping=grouping: legacy_origin_summary(grouping()),
+            lambda grouping=grouping: Retirements.origin_summary.func(retirements, grouping()),
+        )
+
+    pools = Pools()
+    tokens = tokens_df().set_index("name").transpose().to_dict(orient="dict")
+    addresses = [token["token_address"] for token in tokens.values()]
+    for freq in ["daily", "monthly"]:
+        freq_df = pools.date_manipulations(pools_df(rows, addresses), "retirement_date", freq)
+
+        def grouping(freq_df=freq_df):
+            return freq_df.groupby("retirement_date", group_keys=False, observed=True)
+        yield (
+            f"pools_summary/{freq}",
+            lambda grouping=grouping: legacy_pools_summary(grouping(), "retirement_date", tokens),
+            lambda grouping=grouping: Pools.pool_summary.func(pools, grouping(), "retirement_date"),
+        )
+
+
+def main(rows: int):
+    print(f"{'case':<30} {'legacy (ms)':>12} {'vectorized (ms)':>16} {'speedup':>8}")
+    for name, legacy, vectorized in cases(rows):
+        compare(legacy(), vectorized())
+        legacy_time = min(timeit.repeat(legacy, number=1, repeat=3))
+        vectorized_time = min(timeit.repeat(vectorized, number=1, repeat=3))
+        print(
+            f"{name:<30} {legacy_time * 1000:>12.1f} {vectorized_time * 1000:>16.1f}"
+            f" {legacy_time / vectorized_time:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    with offline_app({"tokens_data_v2": tokens_df()}):
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
@@ -2,6 +2,7 @@ from flask import Flask, make_response
 import json
 from . import endpoints
 from . import api_helpers
+from .warmer import CacheWarmer
 from src.apps import services
 
 # Initialize app
@@ -65,7 +66,14 @@ api.add_resource(endpoints.RetirementsBeneficiariesAggregation, '/retirements/<s
 api.add_resource(endpoints.RetirementsOriginAndDatesAggregation, '/retirements/all/agg/origin/<string:freq>')
 
 
+# Internal endpoints
+api.add_resource(endpoints.CacheMetrics, '/internal/cache')
+
 api.add_resource(endpoints.Info, '', '/')
 
+# Warm the caches after deploys and datasets refreshes
+warmer = CacheWarmer()
+warmer.init_app(app)
+
 if __name__ == '__main__':
     app.run(debug=True, host="0.0.0.0", port=8050)
@@ -38,3 +38,4 @@ from .retirements import (  # noqa
     RetirementsOriginAndDatesAggregation,
 )
 from .tokens import Tokens  # noqa
+from .cache_metrics import CacheMetrics  # noqa
@@ -0,0 +1,31 @@
+import hmac
+from flask import current_app, request
+from flask_restful import Resource, abort
+from src.util import getenv, is_production
+from src.apps.services import cache_metrics, caches_stats
+
+# Token required to read the internal endpoints, sent as "Authorization: Bearer <token>".
+# Without it the internal endpoints are only available outside production
+INTERNAL_TOKEN = getenv("DASH_INTERNAL_TOKEN")
+
+
+def check_internal_access():
+    """Aborts the request if the caller is not allowed to read the internal endpoints"""
+    if INTERNAL_TOKEN:
+        authorization = request.headers.get("Authorization", "")
+        if not hmac.compare_digest(authorization.encode(), f"Bearer {INTERNAL_TOKEN}".encode()):
+            abort(403)
+    elif is_production():
+        abort(404)
+
+
+class CacheMetrics(Resource):
+    """Internal endpoint exposing the cache metrics of this process"""
+    def get(self):
+        check_internal_access()
+        warmer = current_app.extensions.get("cache_warmer")
+        return {
+            "commands": cache_metrics.snapshot(),
+            "caches": caches_stats(),
+            "warmer": warmer.status() if warmer else None,
+        }
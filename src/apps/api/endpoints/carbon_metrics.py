@@ -1,5 +1,5 @@
 from flask_restful import Resource, reqparse
-from src.apps.services import Metrics as Service, layout_cache, DashArgumentException
+from src.apps.services import Metrics as Service, layout_cache, DashArgumentException, query_string_cache_key
 from . import helpers
 
 carbon_metrics_parser = reqparse.RequestParser()
@@ -7,7 +7,7 @@ carbon_metrics_parser.add_argument('sample', type=helpers.validate_list(["daily"
 
 
 class CarbonMetrics(Resource):
-    @layout_cache.cached(query_string=True)
+    @layout_cache.cached(key_prefix=query_string_cache_key)
     @helpers.with_errors_handler
     @helpers.with_help(
         f"""
@@ -1,5 +1,5 @@
 from flask_restful import Resource, reqparse
-from src.apps.services import Credits as Service, layout_cache
+from src.apps.services import Credits as Service, layout_cache, query_string_cache_key
 from . import helpers
 
 
@@ -89,7 +89,7 @@ class AbstractCredits(Resource):
 
 
 class CreditsRaw(AbstractCredits):
-    @layout_cache.cached(query_string=True)
+    @layout_cache.cached(key_prefix=query_string_cache_key)
     @helpers.with_errors_handler
     @helpers.with_help(
         f"""{BASE_HELP}
@@ -103,7 +103,7 @@ class CreditsRaw(AbstractCredits):
 
 
 class CreditsDatesAggregation(AbstractCredits):
-    @layout_cache.cached(query_string=True)
+    @layout_cache.cached(key_prefix=query_string_cache_key)
     @helpers.with_errors_handler
     @helpers.with_help(
         f"""{BASE_HELP}
@@ -123,7 +123,7 @@ class CreditsDatesAggregation(AbstractCredits):
 
 
 class CreditsCountriesAggregation(AbstractCredits):
-    @layout_cache.cached(query_string=True)
+    @layout_cache.cached(key_prefix=query_string_cache_key)
     @helpers.with_errors_handler
     @helpers.with_help(
         f"""{BASE_HELP}
@@ -137,7 +137,7 @@ class CreditsCountriesAggregation(AbstractCredits):
 
 
 class CreditsProjectsAggregation(AbstractCredits):
-    @layout_cache.cached(query_string=True)
+    @layout_cache.cached(key_prefix=query_string_cache_key)
     @helpers.with_errors_handler
     @helpers.with_help(
         f"""{BASE_HELP}
@@ -151,7 +151,7 @@ class CreditsProjectsAggregation(AbstractCredits):
 
 
 class CreditsMethodologiesAggregation(AbstractCredits):
-    @layout_cache.cached(query_string=True)
+    @layout_cache.cached(key_prefix=query_string_cache_key)
     @helpers.with_errors_handler
     @helpers.with_help(
         f"""{BASE_HELP}
@@ -165,7 +165,7 @@ class CreditsMethodologiesAggregation(AbstractCredits):
 
 
 class CreditsVintageAggregation(AbstractCredits):
-    @layout_cache.cached(query_string=True)
+    @layout_cache.cached(key_prefix=query_string_cache_key)
     @helpers.with_errors_handler
     @helpers.with_help(
         f"""{BASE_HELP}
@@ -179,7 +179,7 @@ class CreditsVintageAggregation(AbstractCredits):
 
 
 class CreditsPoolAggregation(AbstractCredits):
-    @layout_cache.cached(query_string=True)
+    @layout_cache.cached(key_prefix=query_string_cache_key)
     @helpers.with_errors_handler
     @helpers.with_help(
         f"""{BASE_HELP}
@@ -191,7 +191,7 @@ class CreditsPoolAggregation(AbstractCredits):
 
 
 class CreditsPoolVintageAggregation(AbstractCredits):
-    @layout_cache.cached(query_string=True)
+    @layout_cache.cached(key_prefix=query_string_cache_key)
     @helpers.with_errors_handler
     @helpers.with_help(
         f"""{BASE_HELP}
@@ -205,7 +205,7 @@ class CreditsPoolVintageAggregation(AbstractCredits):
 
 
 class CreditsPoolMethodologyAggregation(AbstractCredits):
-    @layout_cache.cached(query_string=True)
+    @layout_cache.cached(key_prefix=query_string_cache_key)
     @helpers.with_errors_handler
     @helpers.with_help(
         f"""{BASE_HELP}
@@ -219,7 +219,7 @@ class CreditsPoolMethodologyAggregation(AbstractCredits):
 
 
 class CreditsPoolCountriesAggregation(AbstractCredits):
-    @layout_cache.cached(query_string=True)
+    @layout_cache.cached(key_prefix=query_string_cache_key)
     @helpers.with_errors_handler
     @helpers.with_help(
         f"""{BASE_HELP}
@@ -233,7 +233,7 @@ class CreditsPoolCountriesAggregation(AbstractCredits):
 
 
 class CreditsPoolProjectsAggregation(AbstractCredits):
-    @layout_cache.cached(query_string=True)
+    @layout_cache.cached(key_prefix=query_string_cache_key)
     @helpers.with_errors_handler
     @helpers.with_help(
         f"""{BASE_HELP}
@@ -247,7 +247,7 @@ class CreditsPoolProjectsAggregation(AbstractCredits):
 
 
 class CreditsPoolDatesAggregation(AbstractCredits):
-    @layout_cache.cached(query_string=True)
+    @layout_cache.cached(key_prefix=query_string_cache_key)
     @helpers.with_errors_handler
     @helpers.with_help(
         f"""{BASE_HELP}
@@ -262,7 +262,7 @@ class CreditsPoolDatesAggregation(AbstractCredits):
 
 
 class CreditsBridgeVintageAggregation(AbstractCredits):
-    @layout_cache.cached(query_string=True)
+    @layout_cache.cached(key_prefix=query_string_cache_key)
     @helpers.with_errors_handler
     @helpers.with_help(
         f"""{BASE_HELP}
@@ -276,7 +276,7 @@ class CreditsBridgeVintageAggregation(AbstractCredits):
 
 
 class CreditsBridgeCountriesAggregation(AbstractCredits):
-    @layout_cache.cached(query_string=True)
+    @layout_cache.cached(key_prefix=query_string_cache_key)
     @helpers.with_errors_handler
     @helpers.with_help(
         f"""{BASE_HELP}
@@ -290,7 +290,7 @@ class CreditsBridgeCountriesAggregation(AbstractCredits):
 
 
 class CreditsBridgeProjectsAggregation(AbstractCredits):
-    @layout_cache.cached(query_string=True)
+    @layout_cache.cached(key_prefix=query_string_cache_key)
     @helpers.with_errors_handler
     @helpers.with_help(
         f"""{BASE_HELP}
@@ -304,7 +304,7 @@ class CreditsBridgeProjectsAggregation(AbstractCredits):
 
 
 class CreditsBridgeDateAggregation(AbstractCredits):
-    @layout_cache.cached(query_string=True)
+    @layout_cache.cached(key_prefix=query_string_cache_key)
     @helpers.with_errors_handler
     @helpers.with_help(
         f"""{BASE_HELP}
@@ -319,7 +319,7 @@ class CreditsBridgeDateAggregation(AbstractCredits):
 
 
 class CreditsBridgeAggregation(AbstractCredits):
-    @layout_cache.cached(query_string=True)
+    @layout_cache.cached(key_prefix=query_string_cache_key)
     @helpers.with_errors_handler
     @helpers.with_help(
         f"""{BASE_HELP}
@@ -332,7 +332,7 @@ class CreditsBridgeAggregation(AbstractCredits):
 
 
 class CreditsGlobalAggregation(AbstractCredits):
-    @layout_cache.cached(query_string=True)
+    @layout_cache.cached(key_prefix=query_string_cache_key)
     @helpers.with_errors_handler
     @helpers.with_help(
         f"""{BASE_HELP}
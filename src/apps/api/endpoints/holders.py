@@ -1,10 +1,10 @@
 from flask_restful import Resource
-from src.apps.services import Holdings as Service, layout_cache
+from src.apps.services import Holdings as Service, layout_cache, query_string_cache_key
 from . import helpers
 
 
 class Holders(Resource):
-    @layout_cache.cached(query_string=True)
+    @layout_cache.cached(key_prefix=query_string_cache_key)
     @helpers.with_errors_handler
     @helpers.with_help(
         f"""
@@ -1,5 +1,5 @@
 from flask_restful import Resource, reqparse
-from src.apps.services import Pools as Service, layout_cache
+from src.apps.services import Pools as Service, layout_cache, query_string_cache_key
 from . import helpers
 
 
@@ -43,7 +43,7 @@ class AbstractPools(Resource):
 
 
 class PoolsRaw(AbstractPools):
-    @layout_cache.cached(query_string=True)
+    @layout_cache.cached(key_prefix=query_string_cache_key)
     @helpers.with_errors_handler
     @helpers.with_help(
         f"""{BASE_HELP}
@@ -57,7 +57,7 @@ class PoolsRaw(AbstractPools):
 
 
 class PoolsDatesAggregation(AbstractPools):
-    @layout_cache.cached(query_string=True)
+    @layout_cache.cached(key_prefix=query_string_cache_key)
     @helpers.with_errors_handler
     @helpers.with_help(
         f"""{BASE_HELP}
@@ -75,7 +75,7 @@ class PoolsDatesAggregation(AbstractPools):
 
 
 class PoolsTokensAndDatesAggregation(AbstractPools):
-    @layout_cache.cached(query_string=True)
+    @layout_cache.cached(key_prefix=query_string_cache_key)
     @helpers.with_errors_handler
     @helpers.with_help(
         f"""
@@ -91,7 +91,7 @@ class PoolsTokensAndDatesAggregation(AbstractPools):
 
 
 class PoolsGlobalAggregation(AbstractPools):
-    @layout_cache.cached(query_string=True)
+    @layout_cache.cached(key_prefix=query_string_cache_key)
     @helpers.with_errors_handler
     @helpers.with_help(
         f"""{BASE_HELP}
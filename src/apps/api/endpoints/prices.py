@@ -1,5 +1,5 @@
 from flask_restful import Resource, reqparse
-from src.apps.services import Prices as Service, services_short_cache, ALL_TOKENS
+from src.apps.services import Prices as Service, services_short_cache, ALL_TOKENS, query_string_cache_key
 from . import helpers
 
 parser = reqparse.RequestParser()
@@ -7,7 +7,7 @@ parser.add_argument('token', type=helpers.validate_list(ALL_TOKENS))
 
 
 class Prices(Resource):
-    @services_short_cache.cached(query_string=True)
+    @services_short_cache.cached(key_prefix=query_string_cache_key)
     @helpers.with_errors_handler
     @helpers.with_help(
         f"""
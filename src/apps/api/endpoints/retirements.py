@@ -1,7 +1,10 @@
-from flask_restful import Resource
-from src.apps.services import Retirements as Service, layout_cache
+from flask_restful import Resource, reqparse
+from src.apps.services import Retirements as Service, layout_cache, query_string_cache_key, ALL_TOKENS
 from . import helpers
 
+tokens_parser = reqparse.RequestParser()
+tokens_parser.add_argument('token', type=helpers.validate_list(ALL_TOKENS), action="append")
+
 
 def render_aggregation(df):
     return df.agg("quantity", {
@@ -11,7 +14,7 @@ def render_aggregation(df):
 
 
 class RetirementsRaw(Resource):
-    @layout_cache.cached(query_string=True)
+    @layout_cache.cached(key_prefix=query_string_cache_key)
     @helpers.with_errors_handler
     @helpers.with_help(
         f"""
@@ -25,7 +28,7 @@ class RetirementsRaw(Resource):
 
 
 class RetirementsDatesAggregation(Resource):
-    @layout_cache.cached(query_string=True)
+    @layout_cache.cached(key_prefix=query_string_cache_key)
     @helpers.with_errors_handler
     @helpers.with_help(
         f"""
@@ -40,22 +43,24 @@ class RetirementsDatesAggregation(Resource):
 
 
 class RetirementsTokensAndDatesAggregation(Resource):
-    @layout_cache.cached(query_string=True)
+    @layout_cache.cached(key_prefix=query_string_cache_key)
     @helpers.with_errors_handler
     @helpers.with_help(
         f"""
         Aggregates Klima retirements on retirement date and token
+        token: one of {ALL_TOKENS}, can be repeated to summarize only some tokens
         {helpers.OUTPUT_FORMATTER_HELP}
         """
     )
     @helpers.with_output_formatter
     def get(self, freq):
-        retirements = Service().get("klima").date_agg(["retirement_date"], freq).token_summary()
+        tokens = tokens_parser.parse_args()["token"]
+        retirements = Service().get("klima").date_agg(["retirement_date"], freq).token_summary(tokens)
         return retirements
 
 
 class RetirementsOriginAndDatesAggregation(Resource):
-    @layout_cache.cached(query_string=True)
+    @layout_cache.cached(key_prefix=query_string_cache_key)
     @helpers.with_errors_handler
     @helpers.with_help(
         f"""
@@ -70,7 +75,7 @@ class RetirementsOriginAndDatesAggregation(Resource):
 
 
 class RetirementsTokensAggregation(Resource):
-    @layout_cache.cached(query_string=True)
+    @layout_cache.cached(key_prefix=query_string_cache_key)
     @helpers.with_errors_handler
     @helpers.with_help(
         f"""
@@ -85,7 +90,7 @@ class RetirementsTokensAggregation(Resource):
 
 
 class RetirementsBeneficiariesAggregation(Resource):
-    @layout_cache.cached(query_string=True)
+    @layout_cache.cached(key_prefix=query_string_cache_key)
     @helpers.with_errors_handler
     @helpers.with_help(
         f"""
@@ -100,7 +105,7 @@ class RetirementsBeneficiariesAggregation(Resource):
 
 
 class RetirementsGlobalAggregation(Resource):
-    @layout_cache.cached(query_string=True)
+    @layout_cache.cached(key_prefix=query_string_cache_key)
     @helpers.with_errors_handler
     @helpers.with_help(
         f"""
@@ -1,10 +1,10 @@
 from flask_restful import Resource
-from src.apps.services import Tokens as Service, services_short_cache
+from src.apps.services import Tokens as Service, services_short_cache, query_string_cache_key
 from . import helpers
 
 
 class Tokens(Resource):
-    @services_short_cache.cached(query_string=True)
+    @services_short_cache.cached(key_prefix=query_string_cache_key)
     @helpers.with_errors_handler
     @helpers.with_help(
         f"""Get tokens information
@@ -0,0 +1,225 @@
+import os
+import time
+import fcntl
+import itertools
+import threading
+from datetime import datetime
+from urllib.parse import urlencode
+from flask import g, request
+from src.util import getenv, is_production, debug
+from src.apps.services.versions import dataset_versions
+from .endpoints import credits, pools
+
+# Warms the caches after deploys and datasets refreshes. Enabled by default in production
+CACHE_WARMER = getenv("DASH_CACHE_WARMER", "1" if is_production() else "0") == "1"
+# Pause in seconds between two warming requests
+CACHE_WARMER_INTERVAL = float(getenv("DASH_CACHE_WARMER_INTERVAL", 1))
+# Maximum time in seconds a warming request waits for the live requests to complete
+CACHE_WARMER_MAX_WAIT = 30
+# Lock electing the process running the warmer among the workers of the host
+CACHE_WARMER_LOCK_FILE = "/tmp/cache-directory/warmer.lock"
+
+# Header identifying the warming requests
+WARMER_HEADER = "X-Dash-Cache-Warmer"
+
+# Values of the path variables of the routes
+PATH_VALUES = {
+    "freq": ["daily", "monthly"],
+    "filter": ["all", "klima"],
+}
+
+# Query parameters combinations by route prefix, by decreasing priority.
+# Routes are first warmed with their default parameters
+QUERY_COMBINATIONS = [
+    ("/credits", {"bridge": credits.BRIDGES}),
+    ("/pools", {"status": pools.STATUSES}),
+    ("/credits", {"bridge": credits.BRIDGES, "status": credits.STATUSES}),
+    ("/pools", {"pool": pools.POOLS, "status": pools.STATUSES}),
+]
+# Query parameters whose value is fixed by routes, by route prefix: the other values return the same results
+FIXED_PARAMETERS = [
+    # Bridges aggregations always select the offchain credits
+    ("/credits/agg/bridge", {"bridge": "offchain"}),
+]
+# Statuses of the credits of each bridge: the API rejects the other combinations.
+# The "all" status is left out, it is the default status
+CREDITS_BRIDGE_STATUSES = {
+    bridge: ["bridged", "retired", "all_retired"] + (["issued"] if bridge == "offchain" else [])
+    for bridge in credits.BRIDGES
+}
+
+
+class CacheWarmer():
+    """
+    Resolves the API aggregation routes in the background so that visitors do not pay for the computation
+    of the results. Routes are enumerated from the application and warmed in priority order: default parameters
+    first. Each request waits for the live requests to complete and is followed by a pause.
+    A new run starts after each datasets refresh.
+    Only one process of the host runs the warmer: the first one taking the lock file.
+    """
+    def __init__(
+        self, prefix="/api/v1", interval=CACHE_WARMER_INTERVAL, enabled=CACHE_WARMER, lock_file=CACHE_WARMER_LOCK_FILE
+    ):
+        self.prefix = prefix
+        self.interval = interval
+        self.enabled = enabled
+        self.lock_file = lock_file
+        # Descriptor of the lock file, held by the process running the warmer until it exits
+        self.lock_fd = None
+        self.app = None
+        self.lock = threading.Lock()
+        self.live_requests = 0
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.progress = {"state": "idle", "runs": 0}
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions["cache_warmer"] = self
+
+        @app.before_request
+        def count_live_request():
+            if WARMER_HEADER not in request.headers:
+                with self.lock:
+                    self.live_requests += 1
+                g.cache_warmer_counted = True
+
+        @app.teardown_request
+        def uncount_live_request(_exc):
+            # Teardown also runs when an earlier before_request handler aborted the request
+            if g.pop("cache_warmer_counted", False):
+                with self.lock:
+                    self.live_requests -= 1
+
+        if self.enabled and self.elect():
+            dataset_versions.subscribe(lambda _versions: self.schedule())
+            self.schedule()
+
+    def elect(self) -> bool:
+        """Tells if this process runs the warmer, taking the lock file if no other process holds it"""
+        if self.lock_fd is not None:
+            return True
+        os.makedirs(os.path.dirname(self.lock_file), exist_ok=True)
+        fd = os.open(self.lock_file, os.O_CREAT | os.O_RDWR, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            debug("Cache warmer: run by another process")
+            self.progress["state"] = "other process"
+            return False
+        self.lock_fd = fd
+        return True
+
+    def routes(self) -> list:
+        """Returns the paths of the GET aggregation routes of the API, with the path variables expanded"""
+        paths = []
+        for rule in sorted(self.app.url_map.iter_rules(), key=lambda rule: rule.rule):
+            if not rule.rule.startswith(self.prefix) or "GET" not in rule.methods:
+                continue
+            if "/agg" not in rule.rule:
+                continue
+            variables = sorted(rule.arguments)
+            if any(variable not in PATH_VALUES for variable in variables):
+                continue
+            for values in itertools.product(*[PATH_VALUES[variable] for variable in variables]):
+                try:
+                    paths.append(rule.build(dict(zip(variables, values)), append_unknown=False)[1])
+                except Exception:
+                    # The values do not match the route converters
+                    continue
+        return list(dict.fromkeys(paths))
+
+    def urls(self) -> list:
+        """Returns the urls to warm by decreasing priority"""
+        paths = self.routes()
+        urls = list(paths)
+        for route_prefix, parameters in QUERY_COMBINATIONS:
+            for path in paths:
+                if not path.startswith(f"{self.prefix}{route_prefix}"):
+                    continue
+                fixed = self.fixed_parameters(path)
+                names = [name for name in parameters if name not in fixed]
+                if not names:
+                    continue
+                for values in itertools.product(*[parameters[name] for name in names]):
+                    query = dict(zip(names, values))
+                    if self.is_served(path, {**query, **fixed}):
+                        urls.append(f"{path}?{urlencode(query)}")
+        return list(dict.fromkeys(urls))
+
+    def fixed_parameters(self, path) -> dict:
+        """Returns the query parameters whose value is fixed by the route of a path"""
+        fixed = {}
+        for route_prefix, parameters in FIXED_PARAMETERS:
+            if path.startswith(f"{self.prefix}{route_prefix}"):
+                fixed.update(parameters)
+        return fixed
+
+    def is_served(self, path, query: dict) -> bool:
+        """Tells if the API serves a combination of query parameters instead of rejecting it"""
+        if path.startswith(f"{self.prefix}/credits") and "status" in query:
+            return query["status"] in CREDITS_BRIDGE_STATUSES[query.get("bridge", "all")]
+        return True
+
+    def schedule(self):
+        """Starts a new run, interrupting the current one"""
+        self.wakeup.set()
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="cache-warmer", daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            self.wakeup.wait()
+            self.wakeup.clear()
+            try:
+                self.warm()
+            except Exception as e:
+                debug(f"Cache warmer error: {str(e)}")
+                self.progress["state"] = "failed"
+
+    def warm(self):
+        urls = self.urls()
+        self.progress = {
+            "state": "running",
+            "runs": self.progress["runs"] + 1,
+            "total": len(urls),
+            "done": 0,
+            "rejected": 0,
+            "failed": 0,
+            "current": None,
+            "started_at": datetime.utcnow().isoformat(),
+            "finished_at": None,
+        }
+        client = self.app.test_client()
+        for url in urls:
+            # A refresh happened: start again with the new datasets
+            if self.wakeup.is_set():
+                self.progress["state"] = "interrupted"
+                return
+            self.wait_for_live_requests()
+            self.progress["current"] = url
+            response = client.get(url, headers={WARMER_HEADER: "1"})
+            self.progress["done"] += 1
+            # Not every combination of the parameters is valid: the API rejects some of them
+            if 400 <= response.status_code < 500:
+                self.progress["rejected"] += 1
+            elif response.status_code != 200:
+                self.progress["failed"] += 1
+            time.sleep(self.interval)
+        self.progress["state"] = "finished"
+        self.progress["current"] = None
+        self.progress["finished_at"] = datetime.utcnow().isoformat()
+        debug(f"Cache warmer: {self.progress}")
+
+    def wait_for_live_requests(self):
+        """Lets the live requests complete first"""
+        waited = 0
+        while self.live_requests > 0 and waited < CACHE_WARMER_MAX_WAIT:
+            time.sleep(0.1)
+            waited += 0.1
+
+    def status(self) -> dict:
+        return dict(self.progress)
@@ -11,11 +11,17 @@ from .cache import ( # noqa
     chained_cached_command,
     final_cached_command,
     single_cached_command,
+    load_cached_command,
+    filter_command,
+    groupby_command,
     DfCacheable,
     KeyCacheable,
+    query_string_cache_key,
+    caches_stats,
     init_app
 )
 from . import helpers  # noqa
+from .cache_metrics import cache_metrics  # noqa
 from .s3 import S3  # noqa
 from .tokens import Tokens  # noqa
 from .credits import Credits  # noqa
@@ -0,0 +1,748 @@
+import os
+import mmap
+import pickle
+import sqlite3
+import struct
+import tempfile
+import logging
+import threading
+from collections import OrderedDict
+from time import time
+import pandas as pd
+import pyarrow as pa
+from flask_caching.backends.base import BaseCache
+from flask_caching.backends.filesystemcache import FileSystemCache
+from flask_caching.backends.rediscache import RedisCache
+from ...util import getenv
+
+logger = logging.getLogger(__name__)
+
+# Format of the DataFrames stored in the caches: pickle or arrow.
+# Pickled DataFrames are the fastest to read back: their numpy buffers are used directly from the mapped file.
+# Arrow files are slower to convert back to pandas but much smaller once compressed
+CACHE_DATAFRAME_FORMAT = getenv("DASH_CACHE_DATAFRAME_FORMAT", "pickle")
+# Compression of the Arrow files: lz4, zstd or uncompressed
+CACHE_ARROW_COMPRESSION = getenv("DASH_CACHE_ARROW_COMPRESSION", "zstd")
+# Size in MB of the in-process memory tier of each file system cache. 0 disables it
+CACHE_MEMORY_SIZE = int(getenv("DASH_CACHE_MEMORY_SIZE", 256))
+
+# Kind of value, written after the expiration time. Pinned values use the lower case
+ARROW_VALUE = b"A"
+PICKLE_VALUE = b"P"
+# Prefix of the values of the shared caches serialized with dump_shared. The RedisCache writes integers in ASCII
+# and other values after "!": the prefix cannot start either of them
+SHARED_VALUE = b"#5"
+
+# Usage of the cache directories is fully recomputed at most with this interval, in seconds,
+# to account for the files written by the other processes
+CACHE_SCAN_INTERVAL = 60
+# Once over budget, the least recently used files are removed until the usage is below this ratio of the budget
+CACHE_EVICTION_TARGET = 0.9
+
+# Out of band buffers are aligned so that numpy arrays can use them directly
+BUFFER_ALIGNMENT = 64
+
+
+def arrow_compatible(value) -> bool:
+    """Tells if a value can be stored as an Arrow table and read back unchanged"""
+    return (
+        type(value) is pd.DataFrame
+        and not isinstance(value.columns, pd.MultiIndex)
+        and value.columns.is_unique
+        and all(isinstance(column, str) for column in value.columns)
+    )
+
+
+def dump_arrow(value: pd.DataFrame):
+    """Serializes a DataFrame into an Arrow IPC file. Returns None if it cannot be converted"""
+    try:
+        table = pa.Table.from_pandas(value, preserve_index=True)
+        compression = None if CACHE_ARROW_COMPRESSION == "uncompressed" else CACHE_ARROW_COMPRESSION
+        options = pa.ipc.IpcWriteOptions(compression=compression)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_file(sink, table.schema, options=options) as writer:
+            writer.write_table(table)
+        return sink.getvalue()
+    except (pa.ArrowException, TypeError, ValueError) as e:
+        logger.debug("Arrow serialization failed, falling back to pickle: %s", e)
+        return None
+
+
+def value_size(value, stored_size: int) -> int:
+    """Estimates the memory used by a value. stored_size is the size of its file:
+    compressed DataFrames use more memory, other values are estimated with it"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    return stored_size
+
+
+def copy_value(value):
+    """Copies the values that callers are allowed to modify so that they do not alter the memory tier"""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy(deep=True)
+    return value
+
+
+def dump_pickle(value, base_offset=0):
+    """Serializes a value with pickle protocol 5. Large buffers (numpy arrays) are kept out of band
+    Layout: buffers count, buffers offsets and sizes, pickle size, pickle, aligned buffers.
+    base_offset is the position of the dump in its file: buffers are aligned in the file, offsets are relative"""
+    buffers = []
+    data = pickle.dumps(value, protocol=5, buffer_callback=buffers.append)
+    raws = [buffer.raw() for buffer in buffers]
+    header_size = 8 + 16 * len(raws) + 8
+    offset = header_size + len(data)
+    entries = []
+    for raw in raws:
+        offset += -(base_offset + offset) % BUFFER_ALIGNMENT
+        entries.append((offset, raw.nbytes))
+        offset += raw.nbytes
+
+    parts = [struct.pack("<Q", len(raws))]
+    parts += [struct.pack("<QQ", start, size) for start, size in entries]
+    parts += [struct.pack("<Q", len(data)), data]
+    position = header_size + len(data)
+    for (start, _size), raw in zip(entries, raws):
+        parts.append(b"\0" * (start - position))
+        parts.append(raw)
+        position = start + raw.nbytes
+    return parts
+
+
+def load_pickle(view: memoryview):
+    """Deserializes a value written by dump_pickle. Out of band buffers are slices of the view"""
+    (count,) = struct.unpack_from("<Q", view, 0)
+    entries = [struct.unpack_from("<QQ", view, 8 + 16 * i) for i in range(count)]
+    data_offset = 8 + 16 * count
+    (data_size,) = struct.unpack_from("<Q", view, data_offset)
+    data_offset += 8
+    buffers = [view[start:start + size] for start, size in entries]
+    return pickle.loads(view[data_offset:data_offset + data_size], buffers=buffers)
+
+
+def dump_shared(value) -> bytes:
+    """Serializes a value stored in a shared cache with the latest pickle protocol.
+    Numpy buffers are pickled as single blocks: large DataFrames are written and read back at memory speed"""
+    return SHARED_VALUE + pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_shared(data: bytes):
+    """Deserializes a value written by dump_shared"""
+    return pickle.loads(memoryview(data)[len(SHARED_VALUE):])
+
+
+class ArrowFileSystemCache(FileSystemCache):
+    """
+    A FileSystemCache storing values with pickle protocol 5, and optionally DataFrames as Arrow IPC files.
+    Files start with the expiration time, pickled like the FileSystemCache does, so that pruning still works.
+    Values are read back from a memory mapped file: Arrow buffers and out of band pickle buffers are not copied.
+    Files written by the FileSystemCache can still be read.
+
+    max_size bounds the size in bytes of the directory (0: unbounded). Once over budget the least recently
+    used files are removed, except the pinned ones. Reads update the modification time of the files
+    so that the recency is shared by all the processes using the directory.
+    Pinned files are only kept up to max_pinned_size bytes (half of max_size by default), the most recently
+    used first: the others are removed like any other file.
+    The usage is counted by the writes and deletes, and recomputed by scanning the directory when enforcing the budget.
+    """
+    def __init__(self, cache_dir, max_size=0, max_pinned_size=None, **kwargs):
+        self.max_size = max_size
+        self.max_pinned_size = max_size // 2 if max_pinned_size is None else max_pinned_size
+        # filename => (inode, pinned): files are replaced, never modified, when they are written
+        self.pinned_files = {}
+        self.usage_lock = threading.Lock()
+        self.size = 0
+        self.entries = 0
+        # Pinned values found by the last scan
+        self.pinned_size = 0
+        self.pinned_entries = 0
+        self.scanned_at = 0
+        self.evictions = 0
+        super(ArrowFileSystemCache, self).__init__(cache_dir, **kwargs)
+        if self.max_size:
+            self.enforce_budget()
+        else:
+            with self.usage_lock:
+                self.rescan()
+
+    def set_pinned(self, key, value, timeout=None):
+        """Stores a value that is never removed to respect the size budget"""
+        return self.set(key, value, timeout, pinned=True)
+
+    def set(self, key, value, timeout=None, mgmt_element=False, pinned=False):
+        return self.write(key, value, timeout, mgmt_element, pinned) is not None
+
+    def write(self, key, value, timeout=None, mgmt_element=False, pinned=False):
+        """Stores a value. Returns the size of its file, or None if it could not be written"""
+        result = None
+
+        # Management elements have no timeout
+        if mgmt_element:
+            timeout = 0
+
+        # Don't prune on management element update, to avoid loop
+        else:
+            self._prune()
+
+        timeout = self._normalize_timeout(timeout)
+        filename = self._get_filename(key)
+        try:
+            fd, tmp = tempfile.mkstemp(
+                suffix=self._fs_transaction_suffix, dir=self._path
+            )
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(timeout, f, 1)
+                self.dump_value(f, value, pinned)
+                size = f.tell()
+            previous_size = self.file_size(filename)
+            is_new_file = previous_size is None
+            os.replace(tmp, filename)
+            os.chmod(filename, self._mode)
+        except (IOError, OSError) as exc:
+            logger.error("set key %r -> %s", key, exc)
+        else:
+            result = size
+            logger.debug("set key %r", key)
+            # Management elements should not count towards threshold
+            if not mgmt_element and is_new_file:
+                self._update_count(delta=1)
+            self.account(size - (previous_size or 0), 1 if is_new_file else 0)
+        return result
+
+    def dump_value(self, f, value, pinned=False):
+        """Writes a value after the expiration time"""
+        if CACHE_DATAFRAME_FORMAT == "arrow" and arrow_compatible(value):
+            buffer = dump_arrow(value)
+            if buffer is not None:
+                f.write(ARROW_VALUE.lower() if pinned else ARROW_VALUE)
+                f.write(buffer)
+                return
+        f.write(PICKLE_VALUE.lower() if pinned else PICKLE_VALUE)
+        # Files are mapped at page boundaries: buffers aligned in the file are aligned in memory
+        for part in dump_pickle(value, f.tell()):
+            f.write(part)
+
+    def get(self, key):
+        return self.get_with_expiration(key)[0]
+
+    def get_first(self, keys):
+        """Returns the position of the first key with a cached value and this value, or (None, None).
+        Missing files are detected without being opened"""
+        for position, key in enumerate(keys):
+            if not self.is_stored(key):
+                continue
+            value = self.get(key)
+            if value is not None:
+                return position, value
+        return None, None
+
+    def is_stored(self, key):
+        """Tells if a key may have a value, without reading it"""
+        return os.path.exists(self._get_filename(key))
+
+    def get_with_expiration(self, key):
+        """Returns a value and its expiration time (0 if it never expires)"""
+        return self.read(key)[:2]
+
+    def read(self, key):
+        """Returns a value, its expiration time (0 if it never expires) and the size of its file"""
+        result = None
+        expired = False
+        hit_or_miss = "miss"
+        pickle_time = 0
+        size = 0
+        filename = self._get_filename(key)
+        try:
+            with open(filename, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                pickle_time = pickle.load(f)
+                expired = pickle_time != 0 and pickle_time < time()
+                if expired:
+                    self.delete(key)
+                else:
+                    hit_or_miss = "hit"
+                    result = self.load_value(f)
+                    if self.max_size:
+                        # Marks the file as recently used
+                        os.utime(filename)
+        except FileNotFoundError:
+            pass
+        except (IOError, OSError, pickle.PickleError, pa.ArrowException, struct.error) as exc:
+            logger.error("get key %r -> %s", key, exc)
+        expiredstr = "(expired)" if expired else ""
+        logger.debug("get key %r -> %s %s", key, hit_or_miss, expiredstr)
+        return result, pickle_time, size
+
+    def delete(self, key, mgmt_element=False):
+        size = self.file_size(self._get_filename(key))
+        deleted = super(ArrowFileSystemCache, self).delete(key, mgmt_element)
+        if deleted and size is not None:
+            self.account(-size, -1)
+        return deleted
+
+    def clear(self):
+        cleared = super(ArrowFileSystemCache, self).clear()
+        with self.usage_lock:
+            self.rescan()
+        return cleared
+
+    def file_size(self, filename):
+        """Returns the size of a file or None if it does not exist"""
+        try:
+            return os.stat(filename).st_size
+        except FileNotFoundError:
+            return None
+
+    def account(self, delta, entries_delta):
+        """Updates the usage of the directory after a write or a delete and enforces the budget"""
+        with self.usage_lock:
+            self.size += delta
+            self.entries += entries_delta
+            if not self.max_size:
+                return
+            over_budget = self.size > self.max_size or time() - self.scanned_at > CACHE_SCAN_INTERVAL
+        if over_budget:
+            self.enforce_budget()
+
+    def scan(self):
+        """Returns the (modification time, size, filename, inode) of the cache files"""
+        files = []
+        for entry in os.scandir(self._path):
+            if entry.name.endswith(self._fs_transaction_suffix) or not entry.is_file():
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path, stat.st_ino))
+        # Forget the files that were removed
+        self.pinned_files = {
+            filename: self.pinned_files[filename]
+            for _mtime, _size, filename, _inode in files
+            if filename in self.pinned_files
+        }
+        return files
+
+    def rescan(self):
+        """Recomputes the usage of the directory and returns its files. Must be called with the usage lock held"""
+        files = self.scan()
+        self.size = sum(size for _mtime, size, _filename, _inode in files)
+        self.entries = len(files)
+        self.scanned_at = time()
+        return files
+
+    def is_pinned(self, filename, inode):
+        """Tells if a file contains a pinned value. Files are only opened the first time they are seen"""
+        known = self.pinned_files.get(filename)
+        if known is not None and known[0] == inode:
+            return known[1]
+        try:
+            with open(filename, "rb") as f:
+                pickle.load(f)
+                pinned = f.read(1).islower()
+        except (IOError, OSError, pickle.PickleError, EOFError):
+            return False
+        self.pinned_files[filename] = (inode, pinned)
+        return pinned
+
+    def kept_pinned_files(self, files) -> set:
+        """Returns the pinned files kept in the budget: the most recently used ones, up to max_pinned_size bytes"""
+        kept = set()
+        pinned_size = 0
+        for _mtime, size, filename, inode in sorted(files, reverse=True):
+            if pinned_size + size <= self.max_pinned_size and self.is_pinned(filename, inode):
+                kept.add(filename)
+                pinned_size += size
+        return kept
+
+    def enforce_budget(self):
+        """Recomputes the usage of the directory and removes the least recently used files if it is over budget"""
+        with self.usage_lock:
+            files = self.rescan()
+            pinned = [size for _mtime, size, filename, inode in files if self.is_pinned(filename, inode)]
+            self.pinned_size = sum(pinned)
+            self.pinned_entries = len(pinned)
+            if self.size <= self.max_size:
+                return
+            kept = self.kept_pinned_files(files)
+            removed = 0
+            for _mtime, size, filename, _inode in sorted(files):
+                if self.size <= self.max_size * CACHE_EVICTION_TARGET:
+                    break
+                if filename.endswith(self._get_filename(self._fs_count_file)) or filename in kept:
+                    continue
+                try:
+                    os.remove(filename)
+                except FileNotFoundError:
+                    pass
+                except OSError as exc:
+                    logger.error("evict %r -> %s", filename, exc)
+                    continue
+                self.size -= size
+                self.entries -= 1
+                removed += 1
+            self.evictions += removed
+            if self.size > self.max_size:
+                logger.warning("cache %r is over budget: %d bytes of pinned values", self._path, self.size)
+            logger.debug("evicted %d file(s) from %r", removed, self._path)
+
+    def usage(self) -> dict:
+        """Usage of the directory seen by this process, without touching the file system"""
+        with self.usage_lock:
+            return {
+                "size": self.size,
+                "max_size": self.max_size,
+                "max_pinned_size": self.max_pinned_size,
+                "entries": self.entries,
+                "pinned_size": self.pinned_size,
+                "pinned_entries": self.pinned_entries,
+                "evictions": self.evictions,
+                "scanned_at": self.scanned_at,
+            }
+
+    def load_value(self, f):
+        """Reads the value following the expiration time"""
+        start = f.tell()
+        kind = f.read(1).upper()
+        if kind == ARROW_VALUE:
+            source = pa.memory_map(f.name)
+            source.seek(start + 1)
+            table = pa.ipc.open_file(source.read_buffer()).read_all()
+            return table.to_pandas(split_blocks=True)
+        elif kind == PICKLE_VALUE:
+            # Copy on write mapping: the values read can be modified without altering the file
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+            return load_pickle(memoryview(mapped)[start + 1:])
+        else:
+            # File written by the FileSystemCache
+            f.seek(start)
+            return pickle.load(f)
+
+
+class MemoryLRU():
+    """An in-process least recently used cache bounded by the total size of its values"""
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        # key => (value, size, expiration time or 0)
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.live_entry(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def contains(self, key):
+        """Tells if a key has a value that has not expired, without counting a hit or a miss"""
+        with self.lock:
+            return self.live_entry(key) is not None
+
+    def live_entry(self, key):
+        """Returns the entry of a key, removing it if it has expired. Must be called with the lock held"""
+        entry = self.entries.get(key)
+        if entry is not None and entry[2] != 0 and entry[2] < time():
+            self.remove(key)
+            return None
+        return entry
+
+    def set(self, key, value, size, expires=0):
+        """Stores a value using size bytes. Values bigger than the cache are not stored"""
+        with self.lock:
+            self.remove(key)
+            if size > self.max_size:
+                return False
+            self.entries[key] = (value, size, expires)
+            self.size += size
+            # Demote the least recently used values: they stay in the file system tier
+            while self.size > self.max_size:
+                self.remove(next(iter(self.entries)))
+                self.evictions += 1
+            return True
+
+    def delete(self, key):
+        with self.lock:
+            return self.remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def remove(self, key):
+        """Removes an entry. Must be called with the lock held"""
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return False
+        self.size -= entry[1]
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "size": self.size,
+            "max_size": self.max_size,
+        }
+
+
+class TieredFileSystemCache(ArrowFileSystemCache):
+    """
+    An ArrowFileSystemCache with an in-process memory tier (L1) in front of the file system (L2).
+    Values are written to both tiers. Values read from the file system are promoted to memory
+    and the least recently used ones are demoted (dropped from memory) once the memory tier is full.
+    """
+    def __init__(self, *args, memory_size=CACHE_MEMORY_SIZE * 1024 * 1024, **kwargs):
+        # Created first: the FileSystemCache writes its files count when initialized
+        self.memory = MemoryLRU(memory_size) if memory_size > 0 else None
+        self.file_system_hits = 0
+        self.file_system_misses = 0
+        super(TieredFileSystemCache, self).__init__(*args, **kwargs)
+
+    def is_memory_cached(self, key):
+        # The files count changes with every write: it is always read from the file system
+        return self.memory is not None and key != self._fs_count_file
+
+    def get(self, key):
+        if self.is_memory_cached(key):
+            value = self.memory.get(key)
+            if value is not None:
+                return copy_value(value)
+
+        value, expires, size = self.read(key)
+        if not self.is_memory_cached(key):
+            return value
+        if value is None:
+            self.file_system_misses += 1
+            return None
+        self.file_system_hits += 1
+        self.memory.set(key, copy_value(value), value_size(value, size), expires)
+        return value
+
+    def is_stored(self, key):
+        # Values in memory are found without touching the file system
+        if not self.is_memory_cached(key):
+            return super(TieredFileSystemCache, self).is_stored(key)
+        if self.memory.contains(key):
+            return True
+        # Counted as misses like when the value is read
+        self.memory.misses += 1
+        stored = super(TieredFileSystemCache, self).is_stored(key)
+        if not stored:
+            self.file_system_misses += 1
+        return stored
+
+    def write(self, key, value, timeout=None, mgmt_element=False, pinned=False):
+        size = super(TieredFileSystemCache, self).write(key, value, timeout, mgmt_element, pinned)
+        if size is not None and not mgmt_element and self.is_memory_cached(key):
+            self.memory.set(key, copy_value(value), value_size(value, size), self._normalize_timeout(timeout))
+        return size
+
+    def delete(self, key, mgmt_element=False):
+        if self.is_memory_cached(key):
+            self.memory.delete(key)
+        return super(TieredFileSystemCache, self).delete(key, mgmt_element)
+
+    def has(self, key):
+        if self.is_memory_cached(key) and self.memory.contains(key):
+            return True
+        return super(TieredFileSystemCache, self).has(key)
+
+    def clear(self):
+        if self.memory is not None:
+            self.memory.clear()
+        return super(TieredFileSystemCache, self).clear()
+
+    def stats(self) -> dict:
+        """Hits, misses and sizes of each tier"""
+        return {
+            "memory": self.memory.stats() if self.memory is not None else None,
+            "file_system": {
+                "hits": self.file_system_hits,
+                "misses": self.file_system_misses,
+                **self.usage(),
+            },
+        }
+
+
+class SharedRedisCache(RedisCache):
+    """
+    A RedisCache shared by all the processes of all the hosts.
+    Values are serialized with pickle protocol 5 so that large DataFrames are quick to read back.
+    """
+    def dump_object(self, value):
+        if type(value) is int:
+            return super(SharedRedisCache, self).dump_object(value)
+        return dump_shared(value)
+
+    def load_object(self, value):
+        if value is not None and value.startswith(SHARED_VALUE):
+            try:
+                return load_shared(value)
+            except (pickle.PickleError, struct.error, EOFError):
+                return None
+        value = super(SharedRedisCache, self).load_object(value)
+        # Values in an unknown format are read back as bytes: they are misses
+        return None if isinstance(value, bytes) else value
+
+    def get_first(self, keys):
+        """Returns the position of the first key with a cached value and this value, or (None, None).
+        The existence of the keys is checked in one round trip and only the first value is fetched"""
+        prefix = self._get_prefix()
+        pipe = self._read_clients.pipeline(transaction=False)
+        for key in keys:
+            pipe.exists(prefix + key)
+        for position, (key, exists) in enumerate(zip(keys, pipe.execute())):
+            if not exists:
+                continue
+            value = self.get(key)
+            if value is not None:
+                return position, value
+        return None, None
+
+
+class SqliteCache(BaseCache):
+    """
+    A cache stored in a sqlite database shared by all the processes of a host.
+    It stands in for the SharedRedisCache in tests and single host deployments, and serializes values the same way.
+    threshold bounds the number of entries (0: unbounded): the least recently written ones are removed first.
+    """
+    def __init__(self, cache_dir, threshold=500, default_timeout=300):
+        super(SqliteCache, self).__init__(default_timeout)
+        # Directory of the database. Key locks files are kept next to it
+        self._path = cache_dir
+        self.filename = os.path.join(cache_dir, "cache.sqlite")
+        self.threshold = threshold
+        self.local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        db = self.connection()
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS entries "
+            "(key TEXT PRIMARY KEY, expires REAL NOT NULL, written REAL NOT NULL, value BLOB NOT NULL)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS entries_written ON entries (written)")
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        args.insert(0, config["CACHE_DIR"])
+        kwargs.update(threshold=config["CACHE_THRESHOLD"])
+        return cls(*args, **kwargs)
+
+    def connection(self) -> sqlite3.Connection:
+        """Returns the connection of the current thread. Connections are not reused by forked processes"""
+        pid, db = getattr(self.local, "connection", (None, None))
+        if pid != os.getpid():
+            db = sqlite3.connect(self.filename, timeout=30, isolation_level=None, check_same_thread=False)
+            # Readers do not block the writer
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = (os.getpid(), db)
+        return db
+
+    def expiration(self, timeout) -> float:
+        timeout = self._normalize_timeout(timeout)
+        return time() + timeout if timeout != 0 else 0
+
+    def get(self, key):
+        row = self.connection().execute(
+            "SELECT value FROM entries WHERE key = ? AND (expires = 0 OR expires > ?)", (key, time())
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        try:
+            value = load_shared(row[0])
+        except (pickle.PickleError, struct.error, EOFError) as exc:
+            logger.error("get key %r -> %s", key, exc)
+            return None
+        self.hits += 1
+        return value
+
+    def get_first(self, keys):
+        """Returns the position of the first key with a cached value and this value, or (None, None).
+        The existence of the keys is checked with one query and only the first value is read"""
+        if not keys:
+            return None, None
+        rows = self.connection().execute(
+            f"SELECT key FROM entries WHERE key IN ({','.join('?' * len(keys))}) AND (expires = 0 OR expires > ?)",
+            (*keys, time()),
+        ).fetchall()
+        stored = {row[0] for row in rows}
+        self.misses += len(keys) - len(stored)
+        for position, key in enumerate(keys):
+            if key not in stored:
+                continue
+            value = self.get(key)
+            if value is not None:
+                return position, value
+        return None, None
+
+    def set(self, key, value, timeout=None):
+        self.prune()
+        self.connection().execute(
+            "INSERT OR REPLACE INTO entries (key, expires, written, value) VALUES (?, ?, ?, ?)",
+            (key, self.expiration(timeout), time(), dump_shared(value)),
+        )
+        return True
+
+    def add(self, key, value, timeout=None):
+        self.prune()
+        db = self.connection()
+        db.execute("DELETE FROM entries WHERE key = ? AND expires != 0 AND expires <= ?", (key, time()))
+        cursor = db.execute(
+            "INSERT OR IGNORE INTO entries (key, expires, written, value) VALUES (?, ?, ?, ?)",
+            (key, self.expiration(timeout), time(), dump_shared(value)),
+        )
+        return cursor.rowcount == 1
+
+    def delete(self, key):
+        return self.connection().execute("DELETE FROM entries WHERE key = ?", (key,)).rowcount == 1
+
+    def has(self, key):
+        return self.connection().execute(
+            "SELECT 1 FROM entries WHERE key = ? AND (expires = 0 OR expires > ?)", (key, time())
+        ).fetchone() is not None
+
+    def clear(self):
+        self.connection().execute("DELETE FROM entries")
+        return True
+
+    def prune(self):
+        """Removes the expired entries, then the least recently written ones once over the threshold"""
+        if not self.threshold:
+            return
+        db = self.connection()
+        (count,) = db.execute("SELECT COUNT(*) FROM entries").fetchone()
+        if count < self.threshold:
+            return
+        db.execute("DELETE FROM entries WHERE expires != 0 AND expires <= ?", (time(),))
+        db.execute(
+            "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY written DESC LIMIT -1 OFFSET ?)",
+            (self.threshold - 1,),
+        )
+
+    def stats(self) -> dict:
+        entries, size = self.connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM entries"
+        ).fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": entries,
+            "size": size,
+            "threshold": self.threshold,
+        }
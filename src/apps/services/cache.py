@@ -1,33 +1,150 @@
 import pandas as pd
+import numpy as np
 import datetime
+import time
+import threading
+from contextlib import nullcontext, contextmanager
+from flask import request, current_app, g, has_app_context
 from flask_caching import Cache
 import hashlib
 import pickle
 import copy
+import functools
 from .helpers import DashArgumentException
-from ...util import getenv # noqa
+from .versions import dataset_versions
+from .locks import key_locks
+from .cache_metrics import cache_metrics
+from ...util import getenv, debug # noqa
 
 # Configure cache
 LAYOUT_CACHE_TIMEOUT = int(getenv("DASH_LAYOUT_CACHE_TIMEOUT", 86400))
 SERVICES_SLOW_CACHE_TIMEOUT = int(getenv("DASH_SERVICES_SLOW_CACHE_TIMEOUT", 86400))
 SERVICES_FAST_CACHE_TIMEOUT = int(getenv("DASH_SERVICES_FAST_CACHE_TIMEOUT", 60))
-
-layout_cache = Cache(
+# Time in seconds during which expired results of the services using it are still served
+# while they are recomputed in the background (stale-while-revalidate)
+SERVICES_FAST_CACHE_STALE_TIMEOUT = int(getenv("DASH_SERVICES_FAST_CACHE_STALE_TIMEOUT", 600))
+# Size budgets of the file system caches in MB
+LAYOUT_CACHE_MAX_SIZE = int(getenv("DASH_LAYOUT_CACHE_MAX_SIZE", 512))
+SERVICES_SLOW_CACHE_MAX_SIZE = int(getenv("DASH_SERVICES_SLOW_CACHE_MAX_SIZE", 2048))
+# Memory mapped file system caches with an in-process memory tier in front of them
+FILE_SYSTEM_CACHE_TYPE = "src.apps.services.backends.TieredFileSystemCache"
+# Backend of the short services cache: local (one per process), redis (shared by all the processes of all the hosts)
+# or sqlite (shared by all the processes of the host)
+SERVICES_CACHE_BACKEND = getenv("DASH_SERVICES_CACHE_BACKEND", "local")
+SERVICES_CACHE_REDIS_URL = getenv("DASH_SERVICES_CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+
+def shared_cache_config(name: str, timeout: int) -> dict:
+    """Configuration of a cache using the shared backend, or None if caches are local"""
+    if SERVICES_CACHE_BACKEND == "redis":
+        return {
+            "CACHE_TYPE": "src.apps.services.backends.SharedRedisCache",
+            "CACHE_REDIS_URL": SERVICES_CACHE_REDIS_URL,
+            "CACHE_KEY_PREFIX": f"dash_{name}_",
+            "CACHE_DEFAULT_TIMEOUT": timeout,
+        }
+    elif SERVICES_CACHE_BACKEND == "sqlite":
+        return {
+            "CACHE_TYPE": "src.apps.services.backends.SqliteCache",
+            "CACHE_DIR": f"/tmp/cache-directory/shared/{name}",
+            "CACHE_DEFAULT_TIMEOUT": timeout,
+        }
+    elif SERVICES_CACHE_BACKEND != "local":
+        raise ValueError(f"Unknown services cache backend {SERVICES_CACHE_BACKEND}")
+    return None
+
+
+def served_stale():
+    """Tells if a result served stale-while-revalidate was used in the current application context"""
+    return has_app_context() and g.get("served_stale", False)
+
+
+def mark_served_stale():
+    """Records that a result served stale-while-revalidate is used in the current application context"""
+    if has_app_context():
+        g.served_stale = True
+
+
+@contextmanager
+def stale_scope():
+    """Tracks apart the stale results used inside the block. They count as used by the enclosing block too"""
+    if not has_app_context():
+        yield
+        return
+    previous = g.get("served_stale", False)
+    g.served_stale = False
+    try:
+        yield
+    finally:
+        g.served_stale = previous or g.served_stale
+
+
+class EndpointCache(Cache):
+    """A Cache of views that does not cache the responses built from results served stale-while-revalidate:
+    they would be served again for a whole timeout after these results are recomputed"""
+    def cached(self, *args, response_filter=None, **kwargs):
+        def fresh_response_filter(rv):
+            return not served_stale() and (response_filter is None or response_filter(rv))
+        return super(EndpointCache, self).cached(*args, response_filter=fresh_response_filter, **kwargs)
+
+
+class MeteredCache(EndpointCache):
+    """A Cache recording the hits and misses of the views it caches in the cache metrics.
+    Views are labelled with the "endpoint" service and the name of the endpoint of the request"""
+    def cached(self, *args, **kwargs):
+        decorator = super(MeteredCache, self).cached(*args, **kwargs)
+
+        def inner(f):
+            # Tells if the current call of the view computed its result
+            computed = threading.local()
+
+            @functools.wraps(f)
+            def compute(*f_args, **f_kwargs):
+                computed.value = True
+                return f(*f_args, **f_kwargs)
+
+            cached_f = decorator(compute)
+
+            @functools.wraps(cached_f)
+            def wrapper(*f_args, **f_kwargs):
+                computed.value = False
+                started = time.perf_counter()
+                res = cached_f(*f_args, **f_kwargs)
+                elapsed = time.perf_counter() - started
+                name = request.endpoint or f.__qualname__
+                if computed.value:
+                    cache_metrics.miss("endpoint", name)
+                    cache_metrics.computed("endpoint", name, elapsed)
+                else:
+                    cache_metrics.hit("endpoint", name, elapsed)
+                return res
+            wrapper.uncached = f
+            return wrapper
+        return inner
+
+
+layout_cache = MeteredCache(
     config={
-        "CACHE_TYPE": "FileSystemCache",
+        "CACHE_TYPE": FILE_SYSTEM_CACHE_TYPE,
         "CACHE_DIR": "/tmp/cache-directory/layout",
         "CACHE_DEFAULT_TIMEOUT": LAYOUT_CACHE_TIMEOUT,
+        # Bounded by size instead of number of entries
+        "CACHE_THRESHOLD": 0,
+        "CACHE_OPTIONS": {"max_size": LAYOUT_CACHE_MAX_SIZE * 1024 * 1024},
     },
 )
 services_long_cache = Cache(
     config={
-        "CACHE_TYPE": "FileSystemCache",
+        "CACHE_TYPE": FILE_SYSTEM_CACHE_TYPE,
         "CACHE_DIR": "/tmp/cache-directory/services",
         "CACHE_DEFAULT_TIMEOUT": SERVICES_SLOW_CACHE_TIMEOUT,
+        # Bounded by size instead of number of entries
+        "CACHE_THRESHOLD": 0,
+        "CACHE_OPTIONS": {"max_size": SERVICES_SLOW_CACHE_MAX_SIZE * 1024 * 1024},
     },
 )
-services_short_cache = Cache(
-    config={
+services_short_cache = EndpointCache(
+    config=shared_cache_config("services_short", SERVICES_FAST_CACHE_TIMEOUT) or {
         "CACHE_TYPE": "SimpleCache",
         "CACHE_DEFAULT_TIMEOUT": SERVICES_FAST_CACHE_TIMEOUT
     },
@@ -39,6 +156,27 @@ def init_app(app):
     services_short_cache.init_app(app)
     layout_cache.init_app(app)
 
+    # Imported here because the S3 service depends on this module
+    from .s3 import S3
+    dataset_versions.init_app(app)
+    dataset_versions.start_refresher(lambda changed: S3.refresh(app, changed))
+
+
+# Kinds of commands. They tell how a command list is planned before being resolved
+# Produces a dataset: its result is cached and shared by all the command lists starting with it
+LOAD = "load"
+# Row filter: fused with the adjacent filters and never cached
+FILTER = "filter"
+# Builds a group-by: it is resolved with the aggregation following it and never cached
+GROUPBY = "groupby"
+# Other commands: only cached when they are the last command of the list
+TRANSFORM = "transform"
+
+
+# Hashes of the results being recomputed in the background
+revalidations = set()
+revalidations_lock = threading.Lock()
+
 
 def key_hash(key: str):
     """Hashes a string"""
@@ -47,19 +185,75 @@ def key_hash(key: str):
     return m.hexdigest()
 
 
+def fresh_key(hash: str):
+    """Key of the marker telling that a result served stale-while-revalidate has not expired yet"""
+    return f"{hash}_fresh"
+
+
+def probe_cache(backend, keys):
+    """Returns the position of the first key with a cached value and this value, or (None, None).
+    Backends implementing get_first only fetch this value, the others fetch all the values at once"""
+    if not keys:
+        return None, None
+    if hasattr(backend, "get_first"):
+        return backend.get_first(keys)
+    for position, value in enumerate(backend.get_many(*keys)):
+        if value is not None:
+            return position, value
+    return None, None
+
+
+def caches_stats() -> dict:
+    """Stats of the caches backends supporting them, indexed by cache name"""
+    caches = {
+        "layout": layout_cache,
+        "services_long": services_long_cache,
+        "services_short": services_short_cache,
+    }
+    return {
+        name: cache.cache.stats()
+        for name, cache in caches.items()
+        if hasattr(cache.cache, "stats")
+    }
+
+
+def query_string_cache_key():
+    """Cache key of an API response.
+    It depends on the path, the query string and the datasets generation"""
+    args = tuple(sorted(request.args.items(multi=True)))
+    return f"{request.path}_{key_hash(str(args))}_{dataset_versions.current().generation}"
+
+
 class KeyCacheable():
     """A base class that enabe extending classes to use the cache decorators"""
+    # Results that are kept when the cache is over its size budget
+    pinned_results = False
+    # Time in seconds during which expired results are still served while they are recomputed
+    # in the background. 0 disables stale-while-revalidate
+    stale_timeout = 0
+
     def __init__(self, commands=[], cache=services_long_cache):
-        self.cache_key: str = self.__class__.__name__
+        # All the datasets used to resolve the commands come from this snapshot
+        self.snapshot = dataset_versions.current()
+        self.cache_key: str = self.base_cache_key()
         self.cache = cache
         self.commands = commands.copy()
+        # Indicates if the last resolve was served entirely from the cache
+        self.cache_hit = False
         if commands:
             self.cache_key = commands[-1]["key"]
 
+    def base_cache_key(self):
+        """Cache key prefix of the command lists.
+        It contains the datasets generation so that results are recomputed when datasets are updated"""
+        return f"{self.__class__.__name__}_{self.snapshot.generation}"
+
     def copy(self):
-        return self.__class__(copy.deepcopy(self.commands))
+        res = self.__class__(copy.deepcopy(self.commands))
+        res.snapshot = self.snapshot
+        return res
 
-    def add_command(self, is_final_command, takes_input, func, *args):
+    def add_command(self, is_final_command, takes_input, func, *args, kind=TRANSFORM):
         """Adds a command to the command list
 
         Arguments:
@@ -67,65 +261,204 @@ class KeyCacheable():
         takes_input: Should we pass an input to the function
         func: The function to be executed
         args: The function's arguments
+        kind: The kind of command, used to plan the resolution
         """
-        serialized_kwargs = pickle.dumps(args)
-        start = f"{self.cache_key}_" if self.cache_key else ""
-        self.cache_key = f"{start}{func.__name__}_{serialized_kwargs}"
-        hash = key_hash(self.cache_key)
+        self.cache_key = self.command_key(self.cache_key, func, args)
 
         self.commands.append({
             "func": func,
             "args": args,
-            "hash": hash,
+            "hash": key_hash(self.cache_key),
             "key": self.cache_key,
+            "kind": kind,
             "is_final_command": is_final_command,
             "takes_input": takes_input
         })
 
-    def get_most_recent_cached_result(self):
-        """ Returns the index of the latest command with a cached result """
-        idx = len(self.commands) - 1
-        res = None
-        while idx >= 0:
-            command = self.commands[idx]
-            res = self.cache.get(command["hash"])
-            if res is not None:
-                break
-            idx = idx - 1
+    def command_key(self, previous_key, func, args):
+        """Cache key of a command following the command with the provided key"""
+        serialized_kwargs = pickle.dumps(args)
+        start = f"{previous_key}_" if previous_key else ""
+        return f"{start}{func.__name__}_{serialized_kwargs}"
 
-        return res, idx
+    def plan(self):
+        """Returns the list of commands to execute to resolve the command list.
+        Extending classes can rewrite it as long as the result stays the same.
+        Cache keys are recomputed from the planned commands
+        """
+        return self.with_keys(self.commands)
+
+    def with_keys(self, commands):
+        """Returns a copy of a list of commands with keys computed from the commands preceding them"""
+        key = self.base_cache_key()
+        res = []
+        for command in commands:
+            key = self.command_key(key, command["func"], command["args"])
+            res.append({**command, "key": key, "hash": key_hash(key)})
+        return res
+
+    def is_materialized(self, plan, idx):
+        """Tells if the result of a command of a plan is cached.
+        Only the result of the plan and loaded datasets are cached: intermediate results are not"""
+        kind = plan[idx].get("kind", TRANSFORM)
+        if idx == len(plan) - 1:
+            return kind != GROUPBY
+        return kind == LOAD
+
+    def get_most_recent_cached_result(self, plan):
+        """ Returns the index of the latest command of a plan with a cached result.
+        The cache is probed once for all the commands"""
+        indexes = [idx for idx in reversed(range(len(plan))) if self.is_materialized(plan, idx)]
+        position, res = probe_cache(self.cache.cache, [plan[idx]["hash"] for idx in indexes])
+        if position is None:
+            return None, -1
+        return res, indexes[position]
+
+    def track(self, command):
+        """Records the cache entry of a command so that it is evicted with its generation"""
+        dataset_versions.track(self.snapshot.generation, self.cache.cache, command["hash"])
 
     def resolve(self):
         """Resolves the command list"""
-
-        # Get the most precise cached command
-        res, idx = self.get_most_recent_cached_result()
-
-        # Resolve the rest without cache
-        while idx + 1 < len(self.commands):
+        # Services instanciated while resolving use the same datasets snapshot
+        with dataset_versions.pinned(self.snapshot), stale_scope():
+            plan = self.plan()
+            started = time.perf_counter()
+
+            # Get the most precise cached command
+            res, idx, stale = self.probe(plan)
+            self.cache_hit = idx == len(plan) - 1
+            if self.cache_hit or not self.is_materialized(plan, len(plan) - 1):
+                return self.execute(plan, res, idx, time.perf_counter() - started, stale)
+
+            # Only one caller computes a missing result, the others wait for it
+            with key_locks.hold(plan[-1]["hash"], self.cache_directory()):
+                # It may have been computed while we were waiting
+                res, idx, stale = self.probe(plan)
+                self.cache_hit = idx == len(plan) - 1
+                return self.execute(plan, res, idx, time.perf_counter() - started, stale)
+
+    def probe(self, plan):
+        """Returns the most recent cached result of a plan, its index and if it is stale.
+        A stale result is served as is while the plan is recomputed in the background"""
+        res, idx = self.get_most_recent_cached_result(plan)
+        stale = idx >= 0 and self.is_stale(plan[idx])
+        if stale:
+            mark_served_stale()
+            self.revalidate(plan)
+        return res, idx, stale
+
+    def execute(self, plan, res, idx, probe_time=0, stale=False):
+        """Executes the commands of a plan following the one at idx, whose result is res.
+        probe_time is the time spent getting res from the cache.
+        Results computed from a stale res, or from stale results of other services, are not cached:
+        they would get a full new lifetime while the revalidation computes the fresh ones"""
+        service = self.__class__.__name__
+        cached_idx = idx
+        self.record_probe(plan, idx, probe_time)
+        started = time.perf_counter()
+        while idx + 1 < len(plan):
             idx = idx + 1
-            command = self.commands[idx]
+            command = plan[idx]
 
+            command_started = time.perf_counter()
             if command["takes_input"]:
                 res = command["func"](self, res, *command["args"])
             else:
                 res = command["func"](self, *command["args"])
+            cache_metrics.computed(service, command["func"].__name__, time.perf_counter() - command_started)
 
             # Cache the results
-            self.cache.set(command["hash"], res)
-
+            if self.is_materialized(plan, idx) and not (stale or served_stale()):
+                self.cache_result(command, res)
+                self.track(command)
+
+        if plan:
+            cache_metrics.log({
+                "service": service,
+                "command": plan[-1]["func"].__name__,
+                "hit": self.cache_hit,
+                "cached_command": plan[cached_idx]["func"].__name__ if cached_idx >= 0 else None,
+                "probe_time": probe_time,
+                "compute_time": time.perf_counter() - started,
+            })
         return res
 
+    def is_stale(self, command):
+        """Tells if the cached result of a command has expired and is only kept to be served while recomputed"""
+        return self.stale_timeout > 0 and not self.cache.cache.has(fresh_key(command["hash"]))
+
+    def revalidate(self, plan):
+        """Recomputes all the commands of a plan in the background. Only one thread recomputes a given plan"""
+        hash = plan[-1]["hash"]
+        with revalidations_lock:
+            if hash in revalidations:
+                return
+            revalidations.add(hash)
+        # Caches are bound to the application: the thread needs its context
+        app = current_app._get_current_object() if current_app else None
+        service = self.copy()
+
+        def run():
+            try:
+                with app.app_context() if app else nullcontext(), dataset_versions.pinned(service.snapshot):
+                    with key_locks.hold(hash, service.cache_directory()):
+                        service.execute(plan, None, -1)
+            except Exception as e:
+                debug(f"Revalidation of {plan[-1]['func'].__name__} failed: {str(e)}")
+            finally:
+                with revalidations_lock:
+                    revalidations.discard(hash)
+
+        threading.Thread(target=run, name="cache-revalidation", daemon=True).start()
+
+    def record_probe(self, plan, idx, probe_time):
+        """Records the hit of the command at idx and the misses of the materialized commands following it"""
+        service = self.__class__.__name__
+        if idx >= 0:
+            cache_metrics.hit(service, plan[idx]["func"].__name__, probe_time)
+        for missed_idx in range(idx + 1, len(plan)):
+            if self.is_materialized(plan, missed_idx):
+                # The probe time is attributed to the result of the plan
+                missed_probe_time = probe_time if idx < 0 and missed_idx == len(plan) - 1 else None
+                cache_metrics.miss(service, plan[missed_idx]["func"].__name__, missed_probe_time)
+
+    def cache_result(self, command, res):
+        """Caches the result of a command. Pinned results are kept when the cache is over its size budget.
+        Results served stale-while-revalidate are kept for stale_timeout seconds after their expiration"""
+        backend = self.cache.cache
+        timeout = None
+        if self.stale_timeout and backend.default_timeout:
+            # Kept after its expiration to be served while it is recomputed. The marker expires with the result
+            timeout = backend.default_timeout + self.stale_timeout
+            backend.set(fresh_key(command["hash"]), True)
+        if self.pinned_results and hasattr(backend, "set_pinned"):
+            backend.set_pinned(command["hash"], res, timeout)
+        else:
+            self.cache.set(command["hash"], res, timeout=timeout)
 
-def cached_command(is_final_command, takes_input):
+        # Size of the entry on the file system
+        if hasattr(backend, "file_size"):
+            size = backend.file_size(backend._get_filename(command["hash"]))
+            if size is not None:
+                cache_metrics.stored(self.__class__.__name__, command["func"].__name__, size)
+
+    def cache_directory(self):
+        """Returns the directory of the cache if it is stored on the file system"""
+        return getattr(self.cache.cache, "_path", None)
+
+
+def cached_command(is_final_command, takes_input, kind=TRANSFORM):
     """Decorates a class method to put it in a command list"""
     def inner(func):
         def wrapper(self: KeyCacheable, *args):
-            self.add_command(is_final_command, takes_input,  func, *args)
+            self.add_command(is_final_command, takes_input,  func, *args, kind=kind)
             if not is_final_command:
                 return self
             else:
                 return self.resolve()
+        # Lets plans recognize the commands of a method
+        wrapper.func = func
         return wrapper
     return inner
 
@@ -145,30 +478,139 @@ def single_cached_command():
     return cached_command(is_final_command=True, takes_input=False)
 
 
+def load_cached_command():
+    """Decorates a method loading a dataset. Its result is cached even if other commands follow it.
+    The method returns the class instance"""
+    return cached_command(is_final_command=False, takes_input=True, kind=LOAD)
+
+
+def filter_command():
+    """Decorates a method filtering rows. The method returns the class instance"""
+    return cached_command(is_final_command=False, takes_input=True, kind=FILTER)
+
+
+def groupby_command():
+    """Decorates a method grouping rows. The group-by is not cached but computed with the following aggregation.
+    The method returns the class instance"""
+    return cached_command(is_final_command=False, takes_input=True, kind=GROUPBY)
+
+
+def group_sum(values: pd.Series, codes, size: int):
+    """Sums values by group like a group-by sum. codes are the numbers (from 0 to size - 1) of the groups
+    of the values. Groups without values sum to 0"""
+    if values.dtype.kind == "f":
+        values = values.to_numpy()
+        nans = np.isnan(values)
+        if nans.any():
+            values = np.where(nans, 0, values)
+        return np.bincount(codes, weights=values, minlength=size).astype(values.dtype, copy=False)
+    return values.groupby(codes).sum().reindex(range(size), fill_value=0).to_numpy()
+
+
+def group_count(values: pd.Series, codes, size: int):
+    """Counts the non missing values by group like a group-by count"""
+    return np.bincount(codes[values.notna().to_numpy()], minlength=size)
+
+
 class DfCacheable(KeyCacheable):
     """ Contains a few basic df manipulation commands"""
-    @chained_cached_command()
+    def plan(self):
+        """Fuses adjacent date ranges into a single filter and drops the date ranges without bounds"""
+        plan = []
+        ranges = []
+        for command in self.commands + [None]:
+            if command is not None and command["kind"] == FILTER and command["func"] is DfCacheable.date_range.func:
+                _date_column, begin, end = command["args"]
+                if begin is not None or end is not None:
+                    ranges.append(command["args"])
+                continue
+            if ranges:
+                # Sorted so that the order of the date ranges does not change the cache keys
+                ranges = tuple(sorted(ranges, key=lambda date_range: date_range[0]))
+                plan.append({
+                    "func": DfCacheable.date_ranges,
+                    "args": (ranges,),
+                    "kind": FILTER,
+                    "is_final_command": False,
+                    "takes_input": True
+                })
+                ranges = []
+            if command is not None:
+                plan.append(command)
+        return self.with_keys(plan)
+
+    @filter_command()
     def date_range(self, df: pd.DataFrame, date_column: str, begin: datetime.datetime, end: datetime.datetime):
         """Adds a date range filter"""
-        def convert_date(date):
-            if isinstance(df[date_column][0], datetime.date):
-                date = datetime.date(date.year, date.month, date.day)
-            return date
-
-        if end is None and begin is None:
-            return df
+        return self.date_ranges(df, [(date_column, begin, end)])
 
+    def date_ranges(self, df: pd.DataFrame, ranges):
+        """Filters rows on several date ranges at once. ranges is a list of (date_column, begin, end)"""
         if df.empty:
             return df
-        if end is not None:
-            df = df[
-                (df[date_column] <= end)
-            ]
-        if begin is not None:
-            df = df[
-                (df[date_column] >= begin)
-            ]
-        return df
+        mask = None
+        for date_column, begin, end in ranges:
+            if end is not None:
+                mask = (df[date_column] <= end) if mask is None else mask & (df[date_column] <= end)
+            if begin is not None:
+                mask = (df[date_column] >= begin) if mask is None else mask & (df[date_column] >= begin)
+        if mask is None:
+            return df
+        return df[mask]
+
+    def group_rows(self, df):
+        """Numbers the groups of a group-by in their order, skipping the groups without rows.
+        A dataframe not grouped yet is a single group.
+        Returns the rows, the number of the group of each row and the position of the first row of each group
+        """
+        if isinstance(df, pd.DataFrame):
+            frame = df
+            codes = np.zeros(len(df), dtype=np.intp)
+        else:
+            frame = df.obj
+            codes = df.ngroup().to_numpy()
+            # Rows with a missing key do not belong to any group
+            in_group = ~np.isnan(codes)
+            if not in_group.all():
+                frame = frame[in_group]
+                codes = codes[in_group]
+
+        codes, groups = pd.factorize(codes, sort=True)
+        firsts = pd.Series(codes).drop_duplicates()
+        first_rows = np.empty(len(groups), dtype=np.intp)
+        first_rows[firsts.to_numpy()] = firsts.index.to_numpy()
+        return frame, codes, first_rows
+
+    def pivot_codes(self, frame, codes, pivot_column, pivot_values, lower=False):
+        """Numbers the (group, pivot value) pairs of the rows whose pivot column is in pivot_values.
+        Categorical columns are matched once per category instead of once per row. With lower the
+        values are compared lower cased.
+        Returns the mask of these rows and their pair numbers: sums by pair reshape to (groups, pivot values)
+        """
+        column = frame[pivot_column]
+        pivot_values = pd.Index(pivot_values)
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            categories = column.cat.categories
+            category_positions = pivot_values.get_indexer(categories.str.lower() if lower else categories)
+            category_codes = column.cat.codes.to_numpy()
+            positions = np.where(category_codes >= 0, category_positions[category_codes], -1)
+        else:
+            positions = pivot_values.get_indexer(column.str.lower() if lower else column)
+        mask = positions >= 0
+        return mask, codes[mask] * len(pivot_values) + positions[mask]
+
+    def group_sums(self, df, kept_fields, columns):
+        """Summarizes each group of a group-by in a row, without running Python code per group.
+        Kept fields take their value in the first row of the group and columns are summed.
+        Rows are in the order of the groups. A dataframe not grouped yet is summarized in a single row
+        """
+        if not isinstance(kept_fields, list):
+            kept_fields = [kept_fields]
+        frame, codes, first_rows = self.group_rows(df)
+        res = frame[kept_fields].iloc[first_rows].reset_index(drop=True)
+        for column in columns:
+            res[column] = group_sum(frame[column], codes, len(first_rows))
+        return res
 
     def date_agg_uncached(self, df, date_column, freq):
         if freq == "daily":
@@ -178,7 +620,7 @@ class DfCacheable(KeyCacheable):
         else:
             raise DashArgumentException("Unknown date aggregation frequency")
 
-    @chained_cached_command()
+    @groupby_command()
     def date_agg(self, df, date_column, freq):
         return self.date_agg_uncached(df, date_column, freq)
 
@@ -188,7 +630,7 @@ class DfCacheable(KeyCacheable):
         date_column = columns[0]
         """Adds an aggregation by day"""
         df = self.date_manipulations(df, date_column, "daily")
-        df = df.groupby(columns, group_keys=False)
+        df = df.groupby(columns, group_keys=False, observed=True)
         return df
 
     def monthly_agg(self, df, columns):
@@ -197,7 +639,7 @@ class DfCacheable(KeyCacheable):
             columns = [columns]
         date_column = columns[0]
         df = self.date_manipulations(df, date_column, "monthly")
-        df = df.groupby(columns, group_keys=False)
+        df = df.groupby(columns, group_keys=False, observed=True)
         return df
 
     @final_cached_command()
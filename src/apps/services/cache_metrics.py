@@ -0,0 +1,111 @@
+import json
+import threading
+from ...util import getenv
+
+# Set to 1 to write a structured (json) log line for each resolved command list, in production too
+CACHE_METRICS_LOG = getenv("DASH_CACHE_METRICS_LOG", "0") == "1"
+
+# Upper bounds of the latency histograms buckets, in seconds
+LATENCY_BUCKETS = [0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, float("inf")]
+
+
+class Histogram():
+    """A cumulative histogram of observed values"""
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "max": self.max,
+            "buckets": [
+                {"le": "+Inf" if bound == float("inf") else bound, "count": count}
+                for bound, count in zip(self.buckets, self.counts)
+            ],
+        }
+
+
+class CommandMetrics():
+    """Metrics of a command of a service"""
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        # Time spent probing the cache (and waiting for another caller to compute the result)
+        self.probe_time = Histogram()
+        self.compute_time = Histogram()
+        self.entries_size = Histogram(buckets=[2 ** i for i in range(10, 34, 2)] + [float("inf")])
+
+    def to_dict(self) -> dict:
+        requests = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / requests if requests else None,
+            "probe_time": self.probe_time.to_dict(),
+            "compute_time": self.compute_time.to_dict(),
+            "entries_size": self.entries_size.to_dict(),
+        }
+
+
+class CacheMetrics():
+    """Cache metrics of the commands, labelled by service class and command name"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (service, command) => CommandMetrics
+        self.commands = {}
+
+    def command(self, service: str, command: str) -> CommandMetrics:
+        """Returns the metrics of a command. Must be called with the lock held"""
+        key = (service, command)
+        if key not in self.commands:
+            self.commands[key] = CommandMetrics()
+        return self.commands[key]
+
+    def hit(self, service: str, command: str, probe_time: float):
+        with self.lock:
+            metrics = self.command(service, command)
+            metrics.hits += 1
+            metrics.probe_time.observe(probe_time)
+
+    def miss(self, service: str, command: str, probe_time: float = None):
+        with self.lock:
+            metrics = self.command(service, command)
+            metrics.misses += 1
+            if probe_time is not None:
+                metrics.probe_time.observe(probe_time)
+
+    def computed(self, service: str, command: str, compute_time: float):
+        with self.lock:
+            self.command(service, command).compute_time.observe(compute_time)
+
+    def stored(self, service: str, command: str, size: int):
+        with self.lock:
+            self.command(service, command).entries_size.observe(size)
+
+    def snapshot(self) -> list:
+        with self.lock:
+            return [
+                {"service": service, "command": command, **metrics.to_dict()}
+                for (service, command), metrics in sorted(self.commands.items())
+            ]
+
+    def log(self, event: dict):
+        """Writes a structured log line to the console"""
+        if CACHE_METRICS_LOG:
+            print(json.dumps({"event": "cache", **event}), flush=True)
+
+
+cache_metrics = CacheMetrics()
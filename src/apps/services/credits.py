@@ -7,7 +7,13 @@ from . import (
     DfCacheable,
     chained_cached_command,
     final_cached_command,
+    load_cached_command,
+    groupby_command,
 )
+from .cache import group_sum, LOAD, TRANSFORM
+
+# Dimensions of the rollup cubes, in addition to the day of the aggregated date column
+ROLLUP_DIMENSIONS = ["country", "country_code", "project_type", "methodology", "vintage"]
 
 
 class Credits(DfCacheable):
@@ -15,7 +21,105 @@ class Credits(DfCacheable):
     def __init__(self, commands=[]):
         super(Credits, self).__init__(commands)
 
-    def load_df(self, bridge: str, pool: str, status: str):
+    def plan(self):
+        """Answers the sums of quantities aggregated on a dimension or on a date from a rollup cube of the credits.
+        The cube is cached once per dataset version and selection of credits, and is much smaller than them.
+        Plans filtering the credits after loading them are resolved on the credits"""
+        plan = super(Credits, self).plan()
+        if len(plan) != 3:
+            return plan
+        load, groupby, aggregation = plan
+        if (
+            load["func"] is not Credits.filter.func
+            or aggregation["func"] is not DfCacheable.sum.func
+            or aggregation["args"] != ("quantity",)
+        ):
+            return plan
+
+        rollup_aggregations = {
+            Credits.countries_agg.func: ["country", "country_code"],
+            Credits.projects_agg.func: ["project_type"],
+            Credits.methodologies_agg.func: ["methodology"],
+            Credits.vintage_agg.func: ["vintage"],
+        }
+        if groupby["func"] in rollup_aggregations:
+            date_column, freq = None, None
+            keys = rollup_aggregations[groupby["func"]]
+        elif groupby["func"] is DfCacheable.date_agg.func:
+            date_column, freq = groupby["args"]
+            if not isinstance(date_column, str) or freq not in ["daily", "monthly"]:
+                return plan
+            keys = [date_column]
+        else:
+            return plan
+
+        return self.with_keys([
+            load,
+            {
+                "func": Credits.rollup,
+                "args": (date_column,),
+                "kind": LOAD,
+                "is_final_command": False,
+                "takes_input": True
+            },
+            {
+                "func": Credits.rollup_sum,
+                "args": (keys, date_column, freq),
+                "kind": TRANSFORM,
+                "is_final_command": True,
+                "takes_input": True
+            },
+        ])
+
+    def rollup(self, df, date_column=None):
+        """Sums the quantities of the credits by rollup dimensions, and by day of the date column if provided.
+        Rows with missing dimensions are kept: aggregations drop them like they do with the credits"""
+        dimensions = [dimension for dimension in ROLLUP_DIMENSIONS if dimension in df]
+        if date_column is not None:
+            if date_column not in df:
+                raise helpers.DashArgumentException(f"Unknown column '{date_column}'")
+            df = self.date_manipulations(df[[date_column] + dimensions + ["quantity"]].copy(), date_column, "daily")
+            dimensions = [date_column] + dimensions
+
+        # Grouped on the codes of the dimensions so that missing values form groups too
+        codes = [
+            df[dimension].cat.codes if isinstance(df[dimension].dtype, pd.CategoricalDtype)
+            else pd.Series(pd.factorize(df[dimension])[0], index=df.index)
+            for dimension in dimensions
+        ]
+        grouped = df.groupby(codes, sort=False) if codes else df
+        return self.group_sums(grouped, dimensions, ["quantity"])
+
+    def rollup_sum(self, cube, keys, date_column=None, freq=None):
+        """Sums the quantities of a rollup cube like the sum of an aggregation of the credits"""
+        if freq == "monthly":
+            # Days are summed first so that only their dates are converted to months
+            cube = cube.groupby(keys, group_keys=False, observed=True)["quantity"].sum().reset_index()
+            cube = self.date_manipulations(cube, date_column, "monthly")
+        res = cube.groupby(keys, group_keys=False, observed=True)["quantity"].sum()
+        return res.reset_index()
+
+    def onchain_slug(self, bridge: str, status: str) -> str:
+        """Returns the slug of the dataset containing the credits of an onchain bridge"""
+        if bridge in ["toucan", "c3", "polygon"]:
+            if status == "bridged":
+                return "polygon_bridged_offsets_v2"
+            elif status in ["retired", "all_retired"]:
+                return "polygon_retired_offsets_v2"
+            else:
+                raise helpers.DashArgumentException(f"Unknown credit status {status}")
+        elif bridge in ["moss", "eth"]:
+            if status == "bridged":
+                return "eth_moss_bridged_offsets_v2"
+            elif status in ["retired", "all_retired"]:
+                return "eth_retired_offsets_v2"
+            else:
+                raise helpers.DashArgumentException(f"Unknown credit status {status}")
+        else:
+            raise helpers.DashArgumentException(f"Unknown bridge {bridge}")
+
+    def load_df(self, bridge: str, pool: str, status: str, columns: list = None):
+        """Loads credits. If columns is provided only these columns are loaded for onchain bridges"""
         s3 = S3()
         # Offchain data
         if bridge in ["offchain"]:
@@ -33,40 +137,37 @@ class Credits(DfCacheable):
             else:
                 raise helpers.DashArgumentException(f"Unknown credit status {status}")
         # One Bridge data
-        elif bridge in ["toucan", "c3", "polygon"]:
-            if status == "bridged":
-                df = s3.load("polygon_bridged_offsets_v2")
-            elif status in ["retired", "all_retired"]:
-                df = s3.load("polygon_retired_offsets_v2")
-            else:
-                raise helpers.DashArgumentException(f"Unknown credit status {status}")
-        elif bridge in ["moss", "eth"]:
-            if status == "bridged":
-                df = s3.load("eth_moss_bridged_offsets_v2")
-            elif status in ["retired", "all_retired"]:
-                df = s3.load("eth_retired_offsets_v2")
-            else:
-                raise helpers.DashArgumentException(f"Unknown credit status {status}")
+        elif bridge in ["toucan", "c3", "polygon", "moss", "eth"]:
+            df = s3.load(self.onchain_slug(bridge, status), columns)
         # All bridges data concatenated
         elif bridge == "all":
+            date_column = helpers.status_date_column(status)
+            kept_columns = [
+                "token_address",
+                date_column,
+                "project_id",
+                "project_id_key",
+                "project_type",
+                "region",
+                "country",
+                "country_code",
+                "methodology",
+                "vintage",
+                "name",
+                "quantity"
+            ]
+            # Only decode the columns we keep and the ones needed to filter
+            loaded_columns = kept_columns + ["bridge"]
+            if pool and pool != "all":
+                loaded_columns = loaded_columns + [f"{pool}_quantity"]
+
+            # Bridges can share a dataset: load each dataset once and concurrently
+            slugs = {bridg: self.onchain_slug(bridg, status) for bridg in helpers.ALL_BRIDGES}
+            slug_dfs = s3.load_many(slugs.values(), loaded_columns)
             dfs = []
             for bridg in helpers.ALL_BRIDGES:
-                bridg_df = self.load_df(bridg, pool, status)
-                date_column = helpers.status_date_column(status)
-                bridg_df = bridg_df[[
-                    "token_address",
-                    date_column,
-                    "project_id",
-                    "project_id_key",
-                    "project_type",
-                    "region",
-                    "country",
-                    "country_code",
-                    "methodology",
-                    "vintage",
-                    "name",
-                    "quantity"
-                ]]
+                bridg_df = self.filter_bridge_and_pool(slug_dfs[slugs[bridg]], bridg, pool)
+                bridg_df = bridg_df[kept_columns]
                 dfs.append(bridg_df)
             df = pd.concat(dfs)
             # Prevent further filtering
@@ -74,6 +175,9 @@ class Credits(DfCacheable):
         else:
             raise helpers.DashArgumentException(f"Unknown bridge {bridge}")
 
+        return self.filter_bridge_and_pool(df, bridge, pool)
+
+    def filter_bridge_and_pool(self, df, bridge, pool):
         # Filter bridge
         if bridge in helpers.ALL_BRIDGES:
             df = df[df["bridge"].str.lower() == bridge.lower()].reset_index(drop=True)
@@ -85,36 +189,37 @@ class Credits(DfCacheable):
 
         return df
 
-    @chained_cached_command()
+    @load_cached_command()
     def filter(self, df, bridge, pool, status):
         """Filters credits on bridge pool and status"""
         # Load dataset
         df = self.load_df(bridge, pool, status)
         return df
 
-    @chained_cached_command()
+    @groupby_command()
     def vintage_agg(self, df):
         """Adds an aggregation on vintage"""
         df = df.groupby("vintage", group_keys=False)
         return df
 
-    @chained_cached_command()
+    @groupby_command()
     def countries_agg(self, df):
-        df = df.groupby(["country", "country_code"], group_keys=False)
+        df = df.groupby(["country", "country_code"], group_keys=False, observed=True)
         return df
 
-    @chained_cached_command()
+    @groupby_command()
     def projects_agg(self, df):
-        df = df.groupby("project_type", group_keys=False)
+        df = df.groupby("project_type", group_keys=False, observed=True)
         return df
 
-    @chained_cached_command()
+    @groupby_command()
     def methodologies_agg(self, df):
-        df = df.groupby("methodology", group_keys=False)
+        df = df.groupby("methodology", group_keys=False, observed=True)
         return df
 
     @chained_cached_command()
     def pool_summary(self, df, kept_fields=[]):
+        """Sums the quantities of each group, or of all the credits, by pool"""
         columns = [
             "bct_quantity",
             "nct_quantity",
@@ -122,61 +227,49 @@ class Credits(DfCacheable):
             "nbo_quantity",
             "mco2_quantity"
         ]
-        if isinstance(df, pd.DataFrame):
-            df = df.groupby(lambda x: True, group_keys=False)
+        frame = df if isinstance(df, pd.DataFrame) else df.obj
+        columns = [column for column in columns if column in frame]
 
-        if not isinstance(kept_fields, list):
-            kept_fields = [kept_fields]
-
-        def summary(df):
-            res_df = pd.DataFrame()
-            for kept_field in kept_fields:
-                res_df[kept_field] = [df[kept_field].iloc[0]]
-
-            total_quantity = df["total_quantity"].sum()
-            res_df["total_quantity"] = [total_quantity]
-            not_pooled_quantity = total_quantity
-            for column in columns:
-                if column in df:
-                    column_quantity = df[column].sum()
-                    res_df[column] = [column_quantity]
-                    not_pooled_quantity -= column_quantity
-            res_df["not_pooled_quantity"] = [not_pooled_quantity]
-
-            return res_df
-        df = df.apply(summary).reset_index(drop=True)
+        # A single group-by sum over all the quantities
+        df = self.group_sums(df, kept_fields, ["total_quantity"] + columns)
+        not_pooled_quantity = df["total_quantity"]
+        for column in columns:
+            not_pooled_quantity = not_pooled_quantity - df[column]
+        df["not_pooled_quantity"] = not_pooled_quantity
         return df
 
     @chained_cached_command()
     def bridge_summary(self, df, kept_fields):
-        # Full aggregation if we are presented a dataframe not grouped yet
-        if isinstance(df, pd.DataFrame):
-            df = df.groupby(lambda x: True)
-
+        """Sums the quantities of each group, or of all the credits, by bridge"""
         column = "quantity"
         if not isinstance(kept_fields, list):
             kept_fields = [kept_fields]
+        bridges = helpers.ALL_BRIDGES
 
-        def summary(df):
-            res_df = pd.DataFrame()
-            for kept_field in kept_fields:
-                res_df[kept_field] = [df[kept_field].iloc[0]]
-            bridged_quantity = 0
-            for bridge in helpers.ALL_BRIDGES:
-                filtered_df = df[df["bridge"].str.lower() == bridge.lower()]
-                this_bridge_quantity = filtered_df[column].sum()
-                res_df[f"{bridge}_quantity"] = [this_bridge_quantity]
-                bridged_quantity = bridged_quantity + this_bridge_quantity
-            total_quantity = df[column].sum()
-            res_df["total_quantity"] = [total_quantity]
-            res_df["not_bridge_quantity"] = [total_quantity - bridged_quantity]
-            res_df["bridge_quantity"] = [bridged_quantity]
-            res_df["bridge_ratio"] = [bridged_quantity / total_quantity]
-            return res_df
-
-        df = df.apply(summary).reset_index(drop=True)
+        frame, codes, first_rows = self.group_rows(df)
+        groups_count = len(first_rows)
+        res = frame[kept_fields].iloc[first_rows].reset_index(drop=True)
 
-        return df
+        # Quantities by group and bridge in a single pass, pivoted into a column per bridge
+        quantities = frame[column]
+        bridged, pair_codes = self.pivot_codes(
+            frame, codes, "bridge", [bridge.lower() for bridge in bridges], lower=True
+        )
+        by_bridge = group_sum(
+            quantities[bridged], pair_codes, groups_count * len(bridges)
+        ).reshape(groups_count, len(bridges))
+
+        bridged_quantity = 0
+        for position, bridge in enumerate(bridges):
+            res[f"{bridge}_quantity"] = by_bridge[:, position]
+            bridged_quantity = bridged_quantity + by_bridge[:, position]
+        total_quantity = group_sum(quantities, codes, groups_count)
+        res["total_quantity"] = total_quantity
+        res["not_bridge_quantity"] = total_quantity - bridged_quantity
+        res["bridge_quantity"] = bridged_quantity
+        res["bridge_ratio"] = bridged_quantity / total_quantity
+
+        return res
 
     @final_cached_command()
     def average(self, df, column, weights):
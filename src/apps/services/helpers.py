@@ -1,5 +1,69 @@
 ALL_BRIDGES = ["toucan", "c3", "moss"]
 ALL_TOKENS = ["ubo", "nbo", "mco2", "nct", "bct"]
+# Datasets whose versions are tracked. Others (like current prices) only rely on the cache timeouts
+VERSIONED_DATASETS = [
+    "verra_data_v2",
+    "verra_retirements",
+    "polygon_bridged_offsets_v2",
+    "polygon_retired_offsets_v2",
+    "eth_moss_bridged_offsets_v2",
+    "eth_retired_offsets_v2",
+    "polygon_pools_retired_offsets",
+    "polygon_pools_deposited_offsets",
+    "polygon_pools_redeemed_offsets",
+    "tokens_data_v2",
+    "assets_prices",
+    "offsets_holders_data",
+    "polygon_carbon_metrics",
+    "eth_carbon_metrics",
+    "celo_carbon_metrics",
+    "all_retirements",
+    "polygon_klima_retirements",
+]
+
+# Low cardinality columns converted to categories when datasets are loaded
+CREDITS_CATEGORICAL_COLUMNS = [
+    "bridge",
+    "project_type",
+    "methodology",
+    "region",
+    "country",
+    "country_code",
+    "status",
+]
+POOLS_CATEGORICAL_COLUMNS = ["pool"]
+RETIREMENTS_CATEGORICAL_COLUMNS = ["token", "origin"]
+CATEGORICAL_COLUMNS = {
+    "verra_data_v2": CREDITS_CATEGORICAL_COLUMNS,
+    "verra_retirements": CREDITS_CATEGORICAL_COLUMNS,
+    "polygon_bridged_offsets_v2": CREDITS_CATEGORICAL_COLUMNS,
+    "polygon_retired_offsets_v2": CREDITS_CATEGORICAL_COLUMNS,
+    "eth_moss_bridged_offsets_v2": CREDITS_CATEGORICAL_COLUMNS,
+    "eth_retired_offsets_v2": CREDITS_CATEGORICAL_COLUMNS,
+    "polygon_pools_retired_offsets": POOLS_CATEGORICAL_COLUMNS,
+    "polygon_pools_deposited_offsets": POOLS_CATEGORICAL_COLUMNS,
+    "polygon_pools_redeemed_offsets": POOLS_CATEGORICAL_COLUMNS,
+    "all_retirements": RETIREMENTS_CATEGORICAL_COLUMNS,
+    "polygon_klima_retirements": RETIREMENTS_CATEGORICAL_COLUMNS,
+}
+# Address columns interned as categories: rows hold integer codes into a per dataset dictionary of addresses
+# The pools "pool" column is already a category
+CREDITS_ADDRESS_COLUMNS = ["token_address"]
+RETIREMENTS_ADDRESS_COLUMNS = ["beneficiary"]
+ADDRESS_COLUMNS = {
+    "verra_data_v2": CREDITS_ADDRESS_COLUMNS,
+    "verra_retirements": CREDITS_ADDRESS_COLUMNS,
+    "polygon_bridged_offsets_v2": CREDITS_ADDRESS_COLUMNS,
+    "polygon_retired_offsets_v2": CREDITS_ADDRESS_COLUMNS,
+    "eth_moss_bridged_offsets_v2": CREDITS_ADDRESS_COLUMNS,
+    "eth_retired_offsets_v2": CREDITS_ADDRESS_COLUMNS,
+    "polygon_pools_retired_offsets": CREDITS_ADDRESS_COLUMNS,
+    "polygon_pools_deposited_offsets": CREDITS_ADDRESS_COLUMNS,
+    "polygon_pools_redeemed_offsets": CREDITS_ADDRESS_COLUMNS,
+    "tokens_data_v2": CREDITS_ADDRESS_COLUMNS,
+    "all_retirements": RETIREMENTS_ADDRESS_COLUMNS,
+    "polygon_klima_retirements": RETIREMENTS_ADDRESS_COLUMNS,
+}
 
 
 class DashArgumentException(Exception):
@@ -0,0 +1,83 @@
+import os
+import zlib
+import fcntl
+import threading
+from contextlib import contextmanager
+from ...util import getenv
+
+# Set to 1 to also coalesce the computations of the different processes sharing a file system cache
+CACHE_FILE_LOCKS = getenv("DASH_CACHE_FILE_LOCKS", "0") == "1"
+
+
+# Number of lock files shared by the keys of the caches when file locks are used
+FILE_LOCKS_COUNT = 64
+
+
+class KeyLocks():
+    """
+    Locks indexed by cache key, used to compute each missing cache entry once (single flight).
+    The first caller computes the result while the other callers wait for it and then read it from the cache.
+    With file locks, the callers of the other processes using the same cache directory wait too.
+    Keys are spread over a fixed number of lock files: keys sharing a file are computed one at a time.
+    """
+    def __init__(self, file_locks=False):
+        self.file_locks = file_locks
+        self.lock = threading.Lock()
+        # key => [lock, number of callers holding or waiting for it]
+        self.locks = {}
+        # Tells if the current thread holds a file lock
+        self.local = threading.local()
+
+    @contextmanager
+    def hold(self, key: str, directory: str = None):
+        """Holds the lock of a key. directory is the directory of the cache if it is stored on the file system.
+        The file lock is taken first, and only by the outermost hold of a thread: a thread never waits
+        for a lock file while holding one, so keys sharing a file cannot deadlock"""
+        if not self.file_locks or not directory or getattr(self.local, "file_locked", False):
+            with self.key_lock(key):
+                yield
+            return
+        with self.file_lock(key, directory):
+            self.local.file_locked = True
+            try:
+                with self.key_lock(key):
+                    yield
+            finally:
+                self.local.file_locked = False
+
+    @contextmanager
+    def key_lock(self, key: str):
+        """Holds the lock of a key in this process"""
+        with self.lock:
+            entry = self.locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self.lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self.locks[key]
+
+    def lock_filename(self, key: str, directory: str) -> str:
+        """Returns the lock file of a key.
+        Lock files are kept next to the cache directory so that the cache does not see them"""
+        locks_directory = os.path.join(os.path.dirname(os.path.normpath(directory)), "locks")
+        return os.path.join(locks_directory, f"{zlib.crc32(key.encode()) % FILE_LOCKS_COUNT}.lock")
+
+    @contextmanager
+    def file_lock(self, key: str, directory: str):
+        """Holds an exclusive lock on the lock file of a key"""
+        filename = self.lock_filename(key, directory)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        fd = os.open(filename, os.O_CREAT | os.O_RDWR, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+
+key_locks = KeyLocks(file_locks=CACHE_FILE_LOCKS)
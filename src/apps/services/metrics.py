@@ -1,4 +1,4 @@
-from . import S3, DfCacheable, chained_cached_command, final_cached_command
+from . import S3, DfCacheable, load_cached_command, final_cached_command
 
 
 class Metrics(DfCacheable):
@@ -6,27 +6,28 @@ class Metrics(DfCacheable):
     def __init__(self, commands=[]):
         super(Metrics, self).__init__(commands)
 
-    @chained_cached_command()
+    @load_cached_command()
     def polygon(self, _df):
         """Get polygon carbon metrics"""
         return S3().load("polygon_carbon_metrics")
 
-    @chained_cached_command()
+    @load_cached_command()
     def eth(self, _df):
         """Get eth carbon metrics"""
         return S3().load("eth_carbon_metrics")
 
-    @chained_cached_command()
+    @load_cached_command()
     def celo(self, _df):
         """Get eth carbon metrics"""
         return S3().load("celo_carbon_metrics")
 
-    @chained_cached_command()
+    @load_cached_command()
     def all(self, _df):
         """Get merged carbon metrics"""
-        celo = S3().load("celo_carbon_metrics").add_suffix("_celo")
-        eth = S3().load("eth_carbon_metrics").add_suffix("_eth")
-        polygon = S3().load("polygon_carbon_metrics").add_suffix("_polygon")
+        dfs = S3().load_many(["celo_carbon_metrics", "eth_carbon_metrics", "polygon_carbon_metrics"])
+        celo = dfs["celo_carbon_metrics"].add_suffix("_celo")
+        eth = dfs["eth_carbon_metrics"].add_suffix("_eth")
+        polygon = dfs["polygon_carbon_metrics"].add_suffix("_polygon")
 
         all = polygon
         all = all.merge(eth, how="outer", left_on="date_polygon", right_on="date_eth")
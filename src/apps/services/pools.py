@@ -1,4 +1,3 @@
-import pandas as pd
 from . import (
     helpers,
     S3,
@@ -7,8 +6,11 @@ from . import (
     DfCacheable,
     DashArgumentException,
     chained_cached_command,
-    final_cached_command
+    final_cached_command,
+    load_cached_command,
+    services_long_cache
 )
+from .cache import group_sum, group_count
 
 
 class Pools(DfCacheable):
@@ -31,7 +33,7 @@ class Pools(DfCacheable):
 
         return df
 
-    @chained_cached_command()
+    @load_cached_command()
     def filter(self, _df, pool, status) -> str:
         return self.load_df(pool, status)
 
@@ -55,22 +57,26 @@ class Pools(DfCacheable):
 
     @chained_cached_command()
     def pool_summary(self, df, date_field):
-        tokens = Tokens().get_dict()
-
-        def summary(df):
-            res_df = pd.DataFrame()
-            res_df[date_field] = [df[date_field].iloc[0]]
-            for token in tokens:
-                address = tokens[token]["token_address"]
-                filtered_df = df[df["pool"] == address]
-                res_df[f"{token.lower()}_quantity"] = [filtered_df["quantity"].sum()]
-                res_df[f"{token.lower()}_count"] = [filtered_df["quantity"].count()]
-            return res_df
+        """Sums and counts the quantities of each group for each token in a single pass"""
+        tokens = Tokens(cache=services_long_cache).addresses()
+        frame, codes, first_rows = self.group_rows(df)
+        groups_count = len(first_rows)
+        res = frame[[date_field]].iloc[first_rows].reset_index(drop=True)
 
-        df = df.apply(summary).reset_index(drop=True)
-        return df
+        # Rows are matched to the pools by address. Tokens sharing an address get the same quantities
+        addresses = list(dict.fromkeys(tokens.values()))
+        pooled, pair_codes = self.pivot_codes(frame, codes, "pool", addresses)
+        quantities = frame["quantity"][pooled]
+        size = groups_count * len(addresses)
+        amounts = group_sum(quantities, pair_codes, size).reshape(groups_count, len(addresses))
+        counts = group_count(quantities, pair_codes, size).reshape(groups_count, len(addresses))
+        for token, address in tokens.items():
+            position = addresses.index(address)
+            res[f"{token.lower()}_quantity"] = amounts[:, position]
+            res[f"{token.lower()}_count"] = counts[:, position]
+        return res
 
     def filter_df_by_pool(self, df, pool):
-        pool_address = Tokens().get(pool)["token_address"]
+        pool_address = Tokens(cache=services_long_cache).addresses()[pool.upper()]
         df = df[(df["pool"] == pool_address)].reset_index(drop=True)
         return df
@@ -1,16 +1,20 @@
 import pandas as pd
-from . import S3, DfCacheable, services_short_cache, chained_cached_command
+from . import S3, DfCacheable, services_short_cache, load_cached_command
+from .cache import SERVICES_FAST_CACHE_STALE_TIMEOUT
 
 
 class Prices(DfCacheable):
     """Service for token prices"""
+    # Latest prices are reloaded in the background when they expire
+    stale_timeout = SERVICES_FAST_CACHE_STALE_TIMEOUT
+
     def __init__(self, commands=[], cache=services_short_cache):
         super(Prices, self).__init__(commands, cache)
 
-    def load_df(self):
+    def load_df(self, columns=None):
         # Merge regular asset prices with latest asset prices
-        latest_prices_df = S3(cache=services_short_cache).load("current_assets_prices")
-        df = S3().load("assets_prices")
+        latest_prices_df = S3(cache=services_short_cache).load("current_assets_prices", columns)
+        df = S3().load("assets_prices", columns)
         # Replace latest entry
         latest_date = latest_prices_df.iloc[0]["date"]
         df.drop(df[df["date"] == latest_date].index, inplace=True)
@@ -18,16 +22,18 @@ class Prices(DfCacheable):
 
         return df
 
-    @chained_cached_command()
+    @load_cached_command()
     def filter(self, df_, token):
-        df = self.load_df()
         if token:
             price_col_name = f"{token}_price"
             address_col_name = f"{token}_address"
+            df = self.load_df(["date", address_col_name, price_col_name])
             a = df[price_col_name].isna()
             df = df[~a].rename(columns={
                 price_col_name: "price",
                 address_col_name: "address",
             })
             df = df[["date", "address", "price"]]
+        else:
+            df = self.load_df()
         return df
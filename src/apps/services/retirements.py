@@ -1,4 +1,3 @@
-import pandas as pd
 from . import (
     S3,
     DashArgumentException,
@@ -6,8 +5,11 @@ from . import (
     final_cached_command,
     chained_cached_command,
     single_cached_command,
+    load_cached_command,
+    groupby_command,
     helpers
 )
+from .cache import group_sum, group_count
 
 
 class Retirements(DfCacheable):
@@ -29,7 +31,7 @@ class Retirements(DfCacheable):
         """Get klima retirements"""
         return self.getDf(filter)
 
-    @chained_cached_command()
+    @load_cached_command()
     def get(self, _df, filter):
         """Get klima retirements"""
         return self.getDf(filter)
@@ -44,43 +46,45 @@ class Retirements(DfCacheable):
             df['token'].isin(tokens)
         ]
 
-    @chained_cached_command()
-    def token_summary(self, df):
-        def summary(df):
-            res_df = pd.DataFrame()
-            res_df["retirement_date"] = [df["retirement_date"].iloc[0]]
-            res_df["amount_retired"] = [df["quantity"].sum()]
-            res_df["number_of_retirements"] = [df["quantity"].count()]
-            for token in helpers.ALL_TOKENS:
-                filtered_df = df[df["token"] == token.upper()]
-                res_df[f"amount_retired_{token}"] = [filtered_df["quantity"].sum()]
-                res_df[f"number_of_retirements_{token}"] = [filtered_df["quantity"].count()]
-            return res_df
-
-        df = df.apply(summary).reset_index(drop=True)
-        return df
+    def pivot_summary(self, df, pivot_column, pivot_values, names, totals=False):
+        """Sums and counts the quantities of each group for each pivot value in a single pass"""
+        frame, codes, first_rows = self.group_rows(df)
+        groups_count = len(first_rows)
+        res = frame[["retirement_date"]].iloc[first_rows].reset_index(drop=True)
 
-    @chained_cached_command()
-    def origin_summary(self, df):
-        def summary(df):
-            res_df = pd.DataFrame()
-            res_df["retirement_date"] = [df["retirement_date"].iloc[0]]
-            for origin in ["Offchain", "Klima"]:
-                filtered_df = df[df["origin"] == origin]
-                res_df[f"amount_retired_{origin.lower()}"] = [filtered_df["quantity"].sum()]
-                res_df[f"number_of_retirements_{origin.lower()}"] = [filtered_df["quantity"].count()]
+        quantities = frame["quantity"]
+        if totals:
+            res["amount_retired"] = group_sum(quantities, codes, groups_count)
+            res["number_of_retirements"] = group_count(quantities, codes, groups_count)
 
-            return res_df
+        pivoted, pair_codes = self.pivot_codes(frame, codes, pivot_column, pivot_values)
+        size = groups_count * len(pivot_values)
+        amounts = group_sum(quantities[pivoted], pair_codes, size).reshape(groups_count, len(pivot_values))
+        counts = group_count(quantities[pivoted], pair_codes, size).reshape(groups_count, len(pivot_values))
+        for position, name in enumerate(names):
+            res[f"amount_retired_{name}"] = amounts[:, position]
+            res[f"number_of_retirements_{name}"] = counts[:, position]
+        return res
 
-        df = df.apply(summary).reset_index(drop=True)
-        return df
+    @chained_cached_command()
+    def token_summary(self, df, tokens=None):
+        """Sums and counts the retirements of each group, in total and by token.
+        tokens restricts the tokens summarized (all by default)"""
+        tokens = [token for token in helpers.ALL_TOKENS if tokens is None or token in tokens]
+        return self.pivot_summary(df, "token", [token.upper() for token in tokens], tokens, totals=True)
 
     @chained_cached_command()
+    def origin_summary(self, df):
+        """Sums and counts the retirements of each group by origin"""
+        origins = ["Offchain", "Klima"]
+        return self.pivot_summary(df, "origin", origins, [origin.lower() for origin in origins])
+
+    @groupby_command()
     def beneficiaries_agg(self, df):
-        df = df.groupby("beneficiary", group_keys=False)
+        df = df.groupby("beneficiary", group_keys=False, observed=True)
         return df
 
-    @chained_cached_command()
+    @groupby_command()
     def tokens_agg(self, df):
-        df = df.groupby("token", group_keys=False)
+        df = df.groupby("token", group_keys=False, observed=True)
         return df
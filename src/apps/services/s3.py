@@ -1,12 +1,122 @@
-from ...util import load_s3_data
-from . import KeyCacheable, single_cached_command, services_long_cache
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from ...util import load_s3_data, getenv, debug
+from . import KeyCacheable, single_cached_command, services_long_cache, helpers
+from .versions import dataset_versions, DatasetSnapshot
+
+LOAD_WORKERS = int(getenv("DASH_SERVICES_LOAD_WORKERS", 4))
+
+# Memory saved by the categorical conversion of the datasets loaded by this process, indexed by slug
+categorical_report = {}
+# Memory saved by the interning of the address columns, indexed by slug
+interning_report = {}
+# Projections of the datasets loaded by the services of this process, indexed by slug then by columns.
+# New versions of the datasets are loaded with the same projections before being published
+loaded_projections = {}
+loaded_projections_lock = threading.Lock()
 
 
 class S3(KeyCacheable):
     """Service for offsets"""
+    # Base datasets are only removed from the cache when their version is not used anymore
+    pinned_results = True
+
     def __init__(self, commands=[], cache=services_long_cache):
         super(S3, self).__init__(commands, cache)
+        self.cached_slugs = []
+
+    def base_cache_key(self):
+        # Datasets are cached by version: they do not depend on the global generation
+        return self.__class__.__name__
+
+    def track(self, command):
+        # Datasets are evicted once their version is not used by any live snapshot.
+        # Datasets without versions only expire with the cache timeout
+        slug, version = command["args"][:2]
+        if version is not None:
+            dataset_versions.track((slug, version), self.cache.cache, command["hash"])
+
+    def load(self, slug, columns=None):
+        """Loads a dataset from the snapshot. If columns is provided only these columns are decoded"""
+        version = self.snapshot.versions.get(slug) or dataset_versions.get(slug)
+        with loaded_projections_lock:
+            projection = tuple(columns) if columns is not None else None
+            loaded_projections.setdefault(slug, {})[projection] = (columns, self.cache)
+        return self.load_version(slug, version, columns)
 
     @single_cached_command()
-    def load(self, slug):
-        return load_s3_data(slug)
+    def load_version(self, slug, version, columns=None):
+        """Loads a dataset. The version is only used as part of the cache key"""
+        df = load_s3_data(slug, columns)
+        df = self.to_categorical(slug, df)
+        return self.intern_addresses(slug, df)
+
+    def to_categorical(self, slug, df, configured_columns=helpers.CATEGORICAL_COLUMNS, report=categorical_report):
+        """Converts the configured low cardinality columns of a dataset to categories"""
+        columns = [
+            column for column in configured_columns.get(slug, [])
+            if column in df and df[column].dtype == object
+        ]
+        if not columns:
+            return df
+        memory_before = df[columns].memory_usage(index=False, deep=True).sum()
+        for column in columns:
+            # Ordered (lexically) so that group-bys keep sorting groups like with strings
+            df[column] = df[column].astype("category").cat.as_ordered()
+        memory_after = df[columns].memory_usage(index=False, deep=True).sum()
+        report[slug] = {
+            "columns": columns,
+            "memory_before": int(memory_before),
+            "memory_after": int(memory_after),
+            "memory_saved": int(memory_before - memory_after),
+        }
+        debug(f"Categorical columns of {slug}: {report[slug]}")
+        return df
+
+    def intern_addresses(self, slug, df):
+        """Interns the address columns of a dataset.
+        Each address is stored once in the categories and rows only hold its integer code:
+        comparisons, joins and group-bys work on the codes and addresses are decoded on serialization
+        """
+        return self.to_categorical(slug, df, helpers.ADDRESS_COLUMNS, interning_report)
+
+    @staticmethod
+    def refresh(app, changed: dict):
+        """Loads new versions of datasets and only then publishes them.
+        Datasets are loaded with the projections the services used, in the caches they used"""
+        # Pin the upcoming snapshot so that the new versions are not evicted before being published
+        snapshot = DatasetSnapshot({**dataset_versions.versions, **changed})
+        with loaded_projections_lock:
+            projections = {slug: list(loaded_projections.get(slug, {}).values()) for slug in changed}
+        with app.app_context(), dataset_versions.pinned(snapshot):
+            for slug, version in changed.items():
+                for columns, cache in projections[slug]:
+                    S3([], cache).load_version(slug, version, columns)
+            dataset_versions.publish(changed)
+
+    def load_many(self, slugs, columns=None) -> dict:
+        """Loads several datasets concurrently. Duplicated slugs are loaded once
+        Returns a dict of dataframes indexed by slug.
+        The slugs that were already cached are then available in self.cached_slugs
+        """
+        slugs = list(dict.fromkeys(slugs))
+        # Caches are bound to the application: workers need its context
+        app = current_app._get_current_object() if current_app else None
+
+        def load(slug):
+            s3 = S3([], self.cache)
+            s3.snapshot = self.snapshot
+            if app:
+                with app.app_context():
+                    df = s3.load(slug, columns)
+            else:
+                df = s3.load(slug, columns)
+            return df, s3.cache_hit
+
+        with ThreadPoolExecutor(max_workers=LOAD_WORKERS) as executor:
+            results = list(executor.map(load, slugs))
+
+        self.cached_slugs = [slug for slug, (_df, cache_hit) in zip(slugs, results) if cache_hit]
+        debug(f"S3 load_many: {slugs} cached: {self.cached_slugs}")
+        return {slug: df for slug, (df, _cache_hit) in zip(slugs, results)}
@@ -4,9 +4,13 @@ from . import S3, KeyCacheable, single_cached_command, services_short_cache
 class Tokens(KeyCacheable):
     """Service for offsets"""
     def __init__(self, commands=[], cache=services_short_cache):
-        self.df = S3([], cache).load("tokens_data_v2")
         super(Tokens, self).__init__(commands, cache)
 
+    @property
+    def df(self):
+        """The tokens dataset. Only loaded by the commands computed, not when their results are cached"""
+        return S3([], self.cache).load("tokens_data_v2")
+
     def get_dict(self):
         return (
             self.df
@@ -19,6 +23,12 @@ class Tokens(KeyCacheable):
     def all(self):
         return self.df
 
+    @single_cached_command()
+    def addresses(self) -> dict:
+        """Returns the addresses of the tokens indexed by name.
+        Cached with the generation of the datasets: in the long services cache it is computed once per generation"""
+        return dict(zip(self.df["name"], self.df["token_address"]))
+
     @single_cached_command()
     def get(self, pool) -> str:
         return self.get_dict()[pool.upper()]
@@ -0,0 +1,190 @@
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from flask import g, has_request_context
+from ...util import getenv, dataset_version, DatasetRefresher, debug
+from .helpers import VERSIONED_DATASETS
+
+# Interval between two checks of the datasets versions. 0 disables versioning
+DATASETS_REFRESH_INTERVAL = int(getenv("DASH_DATASETS_REFRESH_INTERVAL", 600))
+# Maximum number of cache entries tracked for a generation or a (slug, version).
+# The oldest ones are forgotten first: they are then only removed by their cache timeout
+MAX_TRACKED_ENTRIES = 4096
+
+
+class DatasetSnapshot():
+    """An immutable set of datasets versions. The generation identifies it and is part of the cache keys"""
+    def __init__(self, versions: dict):
+        self.versions = versions
+        m = hashlib.sha256()
+        for slug in sorted(versions):
+            m.update(f"{slug}:{versions[slug]};".encode("utf-8"))
+        self.generation = m.hexdigest()[:16]
+
+
+class DatasetVersions():
+    """
+    Versions of the datasets used by the services.
+    The current snapshot is never modified: it is replaced as a whole (RCU).
+    Requests pin the snapshot they started with so that all their loads use the same versions.
+    Cache entries of a snapshot are evicted once it is neither current nor pinned.
+    """
+    def __init__(self, slugs, enabled=True):
+        self.slugs = slugs
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.snapshot = DatasetSnapshot({})
+        # generation => [snapshot, pins count]
+        self.pins = {}
+        # generation or (slug, version) => (cache, hash) => None, in tracking order
+        self.tracked = {}
+        # Functions called with the versions that changed once they are published
+        self.listeners = []
+
+    @property
+    def versions(self) -> dict:
+        return self.snapshot.versions
+
+    @property
+    def generation(self) -> str:
+        return self.snapshot.generation
+
+    def publish(self, new_versions: dict):
+        """Publishes new versions for some datasets"""
+        with self.lock:
+            versions = dict(self.snapshot.versions)
+            changed = {slug: version for slug, version in new_versions.items() if versions.get(slug) != version}
+            versions.update(new_versions)
+            self.snapshot = DatasetSnapshot(versions)
+            evicted = self.evict()
+        self.delete(evicted)
+        if changed:
+            for listener in self.listeners:
+                listener(changed)
+
+    def subscribe(self, listener):
+        """Registers a function called with the versions that changed each time versions are published"""
+        self.listeners.append(listener)
+
+    def initialize(self):
+        """Fetches the versions of all the datasets so that the first generation is complete"""
+        if not self.enabled:
+            return
+
+        def fetch(slug):
+            try:
+                return dataset_version(slug)
+            except Exception as e:
+                debug(f"Could not get the version of {slug}: {str(e)}")
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            versions = dict(zip(self.slugs, executor.map(fetch, self.slugs)))
+        self.publish({slug: version for slug, version in versions.items() if version is not None})
+
+    def get(self, slug: str) -> str:
+        """Returns the current version of a dataset, fetching it if unknown.
+        Returns None for datasets that are not versioned, or whose version could not be fetched"""
+        if not self.enabled or slug not in self.slugs:
+            return None
+        version = self.snapshot.versions.get(slug)
+        if version is None:
+            try:
+                version = dataset_version(slug)
+            except Exception as e:
+                debug(f"Could not get the version of {slug}: {str(e)}")
+                return None
+            self.publish({slug: version})
+        return version
+
+    def current(self) -> DatasetSnapshot:
+        """Returns the snapshot in use: the one being resolved, the one of the request or the latest one"""
+        snapshot = getattr(self.local, "snapshot", None)
+        if snapshot is None and has_request_context():
+            snapshot = g.get("dataset_snapshot")
+        return snapshot or self.snapshot
+
+    def pin(self, snapshot: DatasetSnapshot = None) -> DatasetSnapshot:
+        """Prevents the cache entries of a snapshot (by default the latest one) from being evicted"""
+        with self.lock:
+            snapshot = snapshot or self.snapshot
+            self.pins.setdefault(snapshot.generation, [snapshot, 0])[1] += 1
+            return snapshot
+
+    def unpin(self, snapshot: DatasetSnapshot):
+        with self.lock:
+            pin = self.pins.get(snapshot.generation)
+            if pin is None:
+                return
+            pin[1] -= 1
+            if pin[1] > 0:
+                return
+            del self.pins[snapshot.generation]
+            evicted = self.evict()
+        self.delete(evicted)
+
+    @contextmanager
+    def pinned(self, snapshot: DatasetSnapshot):
+        """Pins a snapshot and makes it the current one of this thread"""
+        previous = getattr(self.local, "snapshot", None)
+        self.pin(snapshot)
+        self.local.snapshot = snapshot
+        try:
+            yield snapshot
+        finally:
+            self.local.snapshot = previous
+            self.unpin(snapshot)
+
+    def track(self, key, cache, hash):
+        """Records a cache entry depending on a generation or on a (slug, version)"""
+        with self.lock:
+            entries = self.tracked.setdefault(key, {})
+            entries.pop((cache, hash), None)
+            entries[(cache, hash)] = None
+            if len(entries) > MAX_TRACKED_ENTRIES:
+                del entries[next(iter(entries))]
+
+    def evict(self) -> list:
+        """Forgets the cache entries that no live snapshot can use and returns them.
+        Must be called with the lock held. They are deleted by delete, once the lock is released"""
+        live = [self.snapshot] + [snapshot for snapshot, _count in self.pins.values()]
+        live_keys = set()
+        for snapshot in live:
+            live_keys.add(snapshot.generation)
+            live_keys.update(snapshot.versions.items())
+        evicted = []
+        for key in [key for key in self.tracked if key not in live_keys]:
+            debug(f"Evict cache entries of {key}")
+            evicted.extend(self.tracked.pop(key))
+        return evicted
+
+    def delete(self, entries: list):
+        """Deletes cache entries returned by evict"""
+        for cache, hash in entries:
+            cache.delete(hash)
+
+    def start_refresher(self, on_change):
+        """Starts polling the versions of the datasets in the background"""
+        if not self.enabled:
+            return None
+        refresher = DatasetRefresher(lambda: self.versions, on_change, DATASETS_REFRESH_INTERVAL)
+        refresher.start()
+        return refresher
+
+    def init_app(self, app):
+        """Pins the latest snapshot for the duration of each request"""
+        self.initialize()
+
+        @app.before_request
+        def pin_dataset_snapshot():
+            g.dataset_snapshot = self.pin()
+
+        @app.teardown_request
+        def unpin_dataset_snapshot(_exc):
+            snapshot = g.pop("dataset_snapshot", None)
+            if snapshot is not None:
+                self.unpin(snapshot)
+
+
+dataset_versions = DatasetVersions(VERSIONED_DATASETS, enabled=DATASETS_REFRESH_INTERVAL > 0)
@@ -1,6 +1,8 @@
 import dash_bootstrap_components as dbc
 import dash
+import threading
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from dash import html, Input, Output, callback, State
 from dash import dcc
 from flask_caching import Cache
@@ -10,7 +12,7 @@ from src.apps.tco2_dashboard.retirement_trends.retirement_trends_page \
     import create_content_retirement_trends, TYPE_POOL, TYPE_TOKEN, \
     TYPE_CHAIN, TYPE_BENEFICIARY, create_retirement_trend_inputs
 
-from ...util import is_production, load_s3_data, debug
+from ...util import is_production, load_s3_data, debug, getenv, dataset_version, DatasetRefresher
 from src.apps.tco2_dashboard.carbon_supply import create_carbon_supply_content
 from .figures import (
     sub_plots_vintage,
@@ -68,6 +70,8 @@ from .constants import (
 )
 
 CACHE_TIMEOUT = 86400
+PREFETCH_WORKERS = int(getenv("DASH_PREFETCH_WORKERS", 8))
+DATASETS_REFRESH_INTERVAL = int(getenv("DASH_DATASETS_REFRESH_INTERVAL", 600))
 GOOGLE_API_ICONS = {
     "href": "https://fonts.googleapis.com/icon?family=Material+Icons|Material+Icons+Outlined|"
     "Material+Icons+Two+Tone|Material+Icons+Round|Material+Icons+Sharp",
@@ -193,41 +197,102 @@ cache = Cache(
     app.server,
     config={
         "CACHE_TYPE": "FileSystemCache",
-        "CACHE_DIR": "/tmp/cache-directory",
+        # Kept apart from the API caches directories
+        "CACHE_DIR": "/tmp/cache-directory/dashboard",
         "CACHE_DEFAULT_TIMEOUT": CACHE_TIMEOUT,
     },
 )
 
 
-@cache.memoize()
-def get_s3_data(slug: str) -> pd.DataFrame:
+@cache.memoize(forced_update=lambda slug, refresh=False: refresh, args_to_ignore=["refresh"])
+def get_s3_data(slug: str, refresh: bool = False) -> pd.DataFrame:
+    """Loads a dataset. refresh forces reloading it (it must be passed positionally)"""
     debug(f"get s3 data: {slug}")
     return load_s3_data(slug)
 
 
-@cache.memoize()
+# Datasets used to generate the layout
+LAYOUT_DATASETS = [
+    "polygon_bridged_offsets",
+    "polygon_retired_offsets",
+    "raw_polygon_pools_deposited_offsets",
+    "raw_polygon_pools_redeemed_offsets",
+    "raw_polygon_pools_retired_offsets",
+    "eth_moss_bridged_offsets",
+    "eth_retired_offsets",
+    "raw_eth_moss_retired_offsets",
+    "verra_data",
+    "tokens_data",
+    "raw_assets_prices",
+    "raw_offsets_holders_data",
+    "raw_polygon_carbon_metrics",
+    "raw_eth_carbon_metrics",
+    "raw_celo_carbon_metrics",
+    "raw_polygon_klima_retirements",
+    "raw_polygon_klima_retirements_daily",
+]
+
+
+# Set by the refresher thread while it regenerates the layout
+layout_refresh = threading.local()
+
+
+def prefetch_s3_data(slugs, refreshed_slugs=set()) -> dict:
+    """Fetches and decodes datasets concurrently. Returns a dict of dataframes indexed by slug"""
+    refresh = [slug in refreshed_slugs for slug in slugs]
+    with ThreadPoolExecutor(max_workers=PREFETCH_WORKERS) as executor:
+        return dict(zip(slugs, executor.map(get_s3_data, slugs, refresh)))
+
+
+def layout_dataset_version(slug: str) -> str:
+    """Returns the version of a dataset, or None if it could not be fetched"""
+    try:
+        return dataset_version(slug)
+    except Exception as e:
+        debug(f"Could not get the version of {slug}: {str(e)}")
+        return None
+
+
+def store_layout_versions(slugs):
+    """Stores the versions of the datasets used by the layout so that the refresher can detect updates.
+    Datasets whose version could not be fetched keep their previous version"""
+    if DATASETS_REFRESH_INTERVAL > 0:
+        with ThreadPoolExecutor(max_workers=PREFETCH_WORKERS) as executor:
+            versions = dict(zip(slugs, executor.map(layout_dataset_version, slugs)))
+        previous_versions = cache.get("layout_versions") or {}
+        cache.set("layout_versions", {
+            slug: version if version is not None else previous_versions.get(slug)
+            for slug, version in versions.items()
+            if version is not None or slug in previous_versions
+        })
+
+
+@cache.memoize(forced_update=lambda: getattr(layout_refresh, "slugs", None) is not None)
 def generate_layout():
     debug("Render: generate_layout")
     curr_time_str = datetime.utcnow().strftime("%b %d %Y %H:%M:%S UTC")
-    df = get_s3_data("polygon_bridged_offsets")
-    df_retired = get_s3_data("polygon_retired_offsets")
+    # Versions are fetched before the data: an update in between is detected by the next poll
+    store_layout_versions(LAYOUT_DATASETS)
+    datasets = prefetch_s3_data(LAYOUT_DATASETS, getattr(layout_refresh, "slugs", None) or set())
+    df = datasets["polygon_bridged_offsets"]
+    df_retired = datasets["polygon_retired_offsets"]
 
-    df_deposited = get_s3_data("raw_polygon_pools_deposited_offsets")
-    df_redeemed = get_s3_data("raw_polygon_pools_redeemed_offsets")
+    df_deposited = datasets["raw_polygon_pools_deposited_offsets"]
+    df_redeemed = datasets["raw_polygon_pools_redeemed_offsets"]
 
-    df_pool_retired = get_s3_data("raw_polygon_pools_retired_offsets")
+    df_pool_retired = datasets["raw_polygon_pools_retired_offsets"]
 
-    df_bridged_mco2 = get_s3_data("eth_moss_bridged_offsets")
-    df_retired_mco2 = get_s3_data("eth_retired_offsets")
-    df_retired_mco2_info = get_s3_data("raw_eth_moss_retired_offsets")
-    df_verra = get_s3_data("verra_data")
+    df_bridged_mco2 = datasets["eth_moss_bridged_offsets"]
+    df_retired_mco2 = datasets["eth_retired_offsets"]
+    df_retired_mco2_info = datasets["raw_eth_moss_retired_offsets"]
+    df_verra = datasets["verra_data"]
     df_verra_toucan = df_verra.query("Toucan")
     df_verra_c3 = df_verra.query("C3")
     df_verra_retired = verra_retired(df_verra)
     verra_fallback_note = ""
 
     tokens_dict = (
-        get_s3_data("tokens_data")
+        datasets["tokens_data"]
         .set_index("Name")
         .transpose()
         .to_dict(orient='dict')
@@ -239,8 +304,8 @@ def generate_layout():
 
     current_price_only_token_list = []
     price_source = "Subgraph"
-    df_prices = get_s3_data("raw_assets_prices")
-    df_holdings = get_s3_data("raw_offsets_holders_data")
+    df_prices = datasets["raw_assets_prices"]
+    df_holdings = datasets["raw_offsets_holders_data"]
 
     # -----TCO2_Figures----
     # Bridge manipulations
@@ -351,9 +416,9 @@ def generate_layout():
     )
 
     # Content carbon supply
-    polygon_carbon_metrics_df = get_s3_data("raw_polygon_carbon_metrics")
-    eth_carbon_metrics_df = get_s3_data("raw_eth_carbon_metrics")
-    celo_carbon_metrics_df = get_s3_data("raw_celo_carbon_metrics")
+    polygon_carbon_metrics_df = datasets["raw_polygon_carbon_metrics"]
+    eth_carbon_metrics_df = datasets["raw_eth_carbon_metrics"]
+    celo_carbon_metrics_df = datasets["raw_celo_carbon_metrics"]
     fig_total_carbon_supply_pie_chart = total_carbon_supply_pie_chart(
         polygon_carbon_metrics_df, eth_carbon_metrics_df, celo_carbon_metrics_df
     )
@@ -938,8 +1003,8 @@ def generate_layout():
     cache.set("content_offchain_vs_onchain", content_offchain_vs_onchain)
 
     # Content Retirement trends
-    klima_retirements_df = get_s3_data("raw_polygon_klima_retirements")
-    daily_agg_klima_retirements_df = get_s3_data("raw_polygon_klima_retirements_daily")
+    klima_retirements_df = datasets["raw_polygon_klima_retirements"]
+    daily_agg_klima_retirements_df = datasets["raw_polygon_klima_retirements_daily"]
 
     retirement_trend_inputs = create_retirement_trend_inputs(
         polygon_carbon_metrics_df,
@@ -1560,6 +1625,27 @@ app.layout = generate_layout
 # cache.delete_memoized(app.layout)
 
 
+def refresh_layout(changed):
+    """Regenerates the layout in the background with the updated datasets.
+    Visitors keep being served the previous layout until the new one is cached"""
+    layout_refresh.slugs = set(changed.keys())
+    try:
+        generate_layout()
+    finally:
+        layout_refresh.slugs = None
+
+
+def start_refresher():
+    """Starts regenerating the layout when its datasets are updated.
+    Called by the server process: by the gunicorn workers or when running this module"""
+    if DATASETS_REFRESH_INTERVAL > 0:
+        DatasetRefresher(
+            lambda: cache.get("layout_versions") or {},
+            refresh_layout,
+            DATASETS_REFRESH_INTERVAL
+        ).start()
+
+
 @callback(
     Output(component_id="Last X Days", component_property="children"),
     Output(component_id="volume plot", component_property="figure"),
@@ -2053,4 +2139,5 @@ for o, d in redirects.items():
 
 
 if __name__ == "__main__":
+    start_refresher()
     app.run_server(debug=True, host="0.0.0.0")
@@ -1,11 +1,16 @@
 import os
 import io
 import base64
+import time
+import tempfile
+import threading
 import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
 from datetime import datetime
 from prefect.results import PersistedResultBlob
 from prefect_aws.s3 import S3Bucket
-from prefect.filesystems import LocalFileSystem
+from botocore.exceptions import ClientError
 from prefect.serializers import Serializer
 from typing_extensions import Literal
 
@@ -16,6 +21,19 @@ def is_production() -> bool:
     return env == "Production"
 
 
+def debug(text: str):
+    """ Write text to console if not in production """
+    if not is_production():
+        print(text, flush=True)
+
+
+def getenv(key: str, default_value=None) -> str:
+    """ Reads an environment variable and logs it to console if not in production """
+    result = os.getenv(key, default_value)
+    debug(f"Env: {key}={result}")
+    return result
+
+
 class DfSerializer(Serializer):
     """
     Serializes Dataframes using feather.
@@ -28,9 +46,44 @@ class DfSerializer(Serializer):
         bytestream.seek(0)
         return base64.encodebytes(bytestream.read())
 
-    def loads(self, blob: bytes) -> pd.DataFrame:
+    def loads(self, blob: bytes, columns: list = None) -> pd.DataFrame:
         bytestream = io.BytesIO(base64.decodebytes(blob))
-        return pd.read_feather(bytestream)
+        return pd.read_feather(bytestream, columns=columns)
+
+
+ARROW_MAGIC = b"ARROW1"
+
+
+class ArrowSerializer():
+    """
+    Serializes Dataframes as compressed Arrow IPC (feather v2) files.
+    Unlike DfSerializer the output is raw binary: it is written as is and is not a prefect serializer,
+    since prefect result blobs only hold text safe data.
+    """
+    def __init__(self, compression: Literal["zstd", "lz4", "uncompressed"] = "zstd"):
+        self.compression = compression
+
+    def dumps(self, df: pd.DataFrame) -> bytes:
+        bytestream = pa.BufferOutputStream()
+        feather.write_feather(df, bytestream, compression=self.compression)
+        return bytestream.getvalue().to_pybytes()
+
+    def loads(self, blob: bytes, columns: list = None) -> pd.DataFrame:
+        # BufferReader wraps the blob without copying it
+        return feather.read_feather(pa.BufferReader(blob), columns=columns)
+
+
+def loads_dataset(file_data: bytes, columns: list = None) -> pd.DataFrame:
+    """ Decodes a dataset file whatever its format: a raw Arrow IPC file or a prefect result blob
+    If columns is provided only these columns are decoded
+    """
+    if file_data[:len(ARROW_MAGIC)] == ARROW_MAGIC:
+        return ArrowSerializer().loads(file_data, columns)
+    blob = PersistedResultBlob.parse_raw(file_data)
+    if isinstance(blob.serializer, DfSerializer):
+        return blob.serializer.loads(blob.data, columns)
+    df = blob.serializer.loads(blob.data)
+    return df[columns] if columns is not None else df
 
 
 class Perf():
@@ -49,38 +102,246 @@ class Perf():
         self.prev = datetime.now()
 
 
-def load_s3_data(slug: str) -> pd.DataFrame:
-    """ Loads json file stored on a prefect block as a panda dataframe """
+def write_arrow_file(df: pd.DataFrame, filename: str):
+    """ Atomically writes a dataframe as an uncompressed Arrow IPC file """
+    # Unique name: several threads and processes may convert the same dataset
+    fd, tmp_filename = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(filename))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            # Uncompressed so that the file can be memory mapped without any decoding
+            feather.write_feather(df, f, compression="uncompressed")
+        os.chmod(tmp_filename, 0o644)
+        os.replace(tmp_filename, filename)
+    except BaseException:
+        os.remove(tmp_filename)
+        raise
+
+
+def read_arrow_file(filename: str, columns: list = None) -> pd.DataFrame:
+    """ Reads an Arrow IPC file using a memory map.
+    Only the selected columns are read and nothing is parsed or decompressed.
+    The columns are then copied on purpose: the dataframe can be modified in place like any other dataset
+    and the file is not kept mapped
+    """
+    with pa.memory_map(filename, "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+        if columns is not None:
+            table = table.select(columns)
+        return table.to_pandas()
+
+
+def load_local_data(base_path: str, slug: str, columns: list = None) -> pd.DataFrame:
+    """ Loads a dataset from a local storage directory.
+    Datasets are converted once to plain Arrow IPC files stored next to the originals (<slug>-latest.arrow)
+    which are then read using a memory map
+    """
+    filename = os.path.join(base_path, f"{slug}-latest")
+    arrow_filename = f"{filename}.arrow"
+    if os.path.exists(arrow_filename) and (
+        not os.path.exists(filename) or
+        os.path.getmtime(arrow_filename) >= os.path.getmtime(filename)
+    ):
+        return read_arrow_file(arrow_filename, columns)
+
+    with open(filename, "rb") as f:
+        df = loads_dataset(f.read())
+    try:
+        write_arrow_file(df, arrow_filename)
+    except OSError as e:
+        # Read only storage: keep the in-memory copy
+        debug(f"Could not write {arrow_filename}: {str(e)}")
+        return df[columns] if columns is not None else df
+    return read_arrow_file(arrow_filename, columns)
+
+
+# Error codes for which the credentials of a block should be reloaded from the Prefect API
+EXPIRED_CREDENTIALS_ERROR_CODES = ["ExpiredToken", "InvalidToken", "InvalidAccessKeyId", "SignatureDoesNotMatch"]
+
+
+class BlockRegistry():
+    """
+    Process wide registry of storage blocks and of their clients.
+    Blocks are resolved once through the Prefect API and S3 clients are reused
+    so that their connection pool stays warm.
+    Blocks are reloaded lazily: when they are older than ttl seconds or when their credentials are rejected.
+    """
+    def __init__(self, loader=S3Bucket.load, ttl=None):
+        self.loader = loader
+        self.ttl = ttl
+        # Guards the dicts below. Blocks and clients are created while holding the lock of their block only
+        self.lock = threading.Lock()
+        self.block_locks = {}
+        self.blocks = {}
+        self.clients = {}
+
+    def block_lock(self, block_name: str) -> threading.Lock:
+        """Returns the lock serializing the loads of a block"""
+        with self.lock:
+            return self.block_locks.setdefault(block_name, threading.Lock())
+
+    def loaded_block(self, block_name: str):
+        """Returns a loaded block if it is still fresh, or None"""
+        with self.lock:
+            entry = self.blocks.get(block_name)
+        if entry is None or (self.ttl is not None and time.monotonic() - entry[1] > self.ttl):
+            return None
+        return entry[0]
+
+    def get_block(self, block_name: str):
+        """Returns a block, loading it if needed"""
+        block = self.loaded_block(block_name)
+        if block is not None:
+            return block
+        with self.block_lock(block_name):
+            # Loaded by another thread in the meantime
+            block = self.loaded_block(block_name)
+            if block is not None:
+                return block
+            debug(f"Load block {block_name}")
+            block = self.loader(block_name)
+            with self.lock:
+                self.blocks[block_name] = (block, time.monotonic())
+                self.clients.pop(block_name, None)
+            return block
+
+    def get_s3_client(self, block_name: str, block: S3Bucket):
+        """Returns the S3 client of a block, creating it if needed. Clients are thread safe"""
+        with self.lock:
+            client = self.clients.get(block_name)
+        if client is not None:
+            return client
+        with self.block_lock(block_name):
+            with self.lock:
+                client = self.clients.get(block_name)
+            if client is None:
+                client = block.credentials.get_s3_client()
+                with self.lock:
+                    self.clients[block_name] = client
+            return client
+
+    def invalidate(self, block_name: str):
+        """Forgets a block and its client"""
+        with self.lock:
+            self.blocks.pop(block_name, None)
+            self.clients.pop(block_name, None)
+
+    def with_credentials_retry(self, block_name: str, func):
+        """Calls func(block), reloading the block and retrying once if its credentials are rejected"""
+        try:
+            return func(self.get_block(block_name))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") not in EXPIRED_CREDENTIALS_ERROR_CODES:
+                raise e
+            # Credentials could have been rotated: reload the block and retry once
+            debug(f"Credentials of block {block_name} rejected, reloading it")
+            self.invalidate(block_name)
+            return func(self.get_block(block_name))
+
+    def read_path(self, block_name: str, path: str) -> bytes:
+        """Reads a file from a block"""
+        def read(block):
+            # Other blocks (LocalFileSystem...) do not hold any client
+            if not isinstance(block, S3Bucket):
+                return block.read_path(path)
+
+            client = self.get_s3_client(block_name, block)
+            with io.BytesIO() as stream:
+                client.download_fileobj(Bucket=block.bucket_name, Key=block._resolve_path(path), Fileobj=stream)
+                return stream.getvalue()
+
+        return self.with_credentials_retry(block_name, read)
+
+    def get_version(self, block_name: str, path: str) -> str:
+        """Returns an identifier of the current version of a file using its metadata only"""
+        def version(block):
+            if not isinstance(block, S3Bucket):
+                return file_version(block._resolve_path(path))
+
+            client = self.get_s3_client(block_name, block)
+            return client.head_object(Bucket=block.bucket_name, Key=block._resolve_path(path))["ETag"]
+
+        return self.with_credentials_retry(block_name, version)
+
+
+BLOCK_REGISTRY_TTL = getenv("DASH_BLOCK_REGISTRY_TTL", None)
+block_registry = BlockRegistry(ttl=int(BLOCK_REGISTRY_TTL) if BLOCK_REGISTRY_TTL else None)
+
+
+def file_version(filename: str) -> str:
+    """ Returns an identifier of the current version of a local file """
+    stat = os.stat(filename)
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+def dataset_version(slug: str) -> str:
+    """ Returns an identifier of the current version of a dataset without downloading it """
     local_storage_base_path = getenv("DASH_USE_LOCAL_STORAGE")
+    filename = f"{slug}-latest"
+    if local_storage_base_path:
+        return file_version(os.path.join(local_storage_base_path, filename))
+    block_name = "prod" if is_production() else "dev"
+    return block_registry.get_version(block_name, filename)
+
+
+class DatasetRefresher(threading.Thread):
+    """
+    Background thread polling the versions of datasets every interval seconds.
+    get_versions returns the currently used versions indexed by slug.
+    on_change is called with the new versions of the slugs that changed: it should load them
+    and only then publish the new versions, so that readers never see partially loaded data.
+    """
+    def __init__(self, get_versions, on_change, interval: int):
+        super(DatasetRefresher, self).__init__(daemon=True, name="dataset-refresher")
+        self.get_versions = get_versions
+        self.on_change = on_change
+        self.interval = interval
+
+    def poll(self):
+        """Checks for new versions and calls on_change if some were found"""
+        changed = {}
+        for slug, version in self.get_versions().items():
+            try:
+                new_version = dataset_version(slug)
+            except Exception as e:
+                debug(f"Could not get the version of {slug}: {str(e)}")
+                continue
+            if new_version != version:
+                changed[slug] = new_version
+        if changed:
+            debug(f"Datasets changed: {list(changed.keys())}")
+            self.on_change(changed)
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.poll()
+            except Exception as e:
+                debug(f"Datasets refresh failed: {str(e)}")
+
+
+def load_s3_data(slug: str, columns: list = None) -> pd.DataFrame:
+    """ Loads json file stored on a prefect block as a panda dataframe
+    If columns is provided only these columns are decoded
+    """
+    local_storage_base_path = getenv("DASH_USE_LOCAL_STORAGE")
+    filename = f"{slug}-latest"
     if local_storage_base_path:
-        block_name = "local"
-        block = LocalFileSystem(basepath=local_storage_base_path)
-    else:
-        block_name = "prod" if is_production() else "dev"
         try:
-            block = S3Bucket.load(block_name)
+            return load_local_data(local_storage_base_path, slug, columns)
         except Exception as e:
-            debug(f"Prefect Error when loading block {block_name}: {str(e)}")
+            debug(f"Error when reading local/{filename}: {str(e)}")
             raise e
-    filename = f"{slug}-latest"
+
+    block_name = "prod" if is_production() else "dev"
     try:
-        file_data = block.read_path(filename)
-        blob = PersistedResultBlob.parse_raw(file_data).data
-        res = DfSerializer().loads(blob)
-        return res
+        block_registry.get_block(block_name)
+    except Exception as e:
+        debug(f"Prefect Error when loading block {block_name}: {str(e)}")
+        raise e
+    try:
+        file_data = block_registry.read_path(block_name, filename)
+        return loads_dataset(file_data, columns)
     except Exception as e:
         debug(f"Prefect Error when reading {block_name}/{filename}: {str(e)}")
         raise e
-
-
-def debug(text: str):
-    """ Write text to console if not in production """
-    if not is_production():
-        print(text, flush=True)
-
-
-def getenv(key: str, default_value=None) -> str:
-    """ Reads an environment variable and logs it to console if not in production """
-    result = os.getenv(key, default_value)
-    debug(f"Env: {key}={result}")
-    return result
@@ -0,0 +1,56 @@
+import pytest
+from flask import Flask
+from prefect.results import PersistedResultBlob
+from src.util import DfSerializer
+from src.apps.services import cache, s3
+from src.apps.services.versions import dataset_versions, DatasetSnapshot
+
+
+def write_dataset(lake, slug, df):
+    """Writes a dataset to a local storage directory like the flows do"""
+    serializer = DfSerializer()
+    blob = PersistedResultBlob(serializer=serializer, data=serializer.dumps(df.reset_index(drop=True)))
+    (lake / f"{slug}-latest").write_bytes(blob.to_bytes())
+
+
+@pytest.fixture
+def lake(tmp_path, monkeypatch):
+    """A local storage directory used instead of the Prefect blocks"""
+    path = tmp_path / "lake"
+    path.mkdir()
+    monkeypatch.setenv("DASH_USE_LOCAL_STORAGE", str(path))
+    return path
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    """Records the slugs and columns of the datasets read from the storage by the services"""
+    calls = []
+    load_s3_data = s3.load_s3_data
+
+    def counting_load_s3_data(slug, columns=None):
+        calls.append((slug, columns))
+        return load_s3_data(slug, columns)
+
+    monkeypatch.setattr(s3, "load_s3_data", counting_load_s3_data)
+    return calls
+
+
+@pytest.fixture
+def services_app(tmp_path, lake, monkeypatch):
+    """An application with empty services caches stored in a temporary directory and no datasets versions"""
+    monkeypatch.setattr(dataset_versions, "snapshot", DatasetSnapshot({}))
+    monkeypatch.setattr(dataset_versions, "pins", {})
+    monkeypatch.setattr(dataset_versions, "tracked", {})
+    monkeypatch.setattr(dataset_versions, "listeners", [])
+    monkeypatch.setattr(s3, "loaded_projections", {})
+
+    app = Flask(__name__)
+    for name, services_cache in [
+        ("layout", cache.layout_cache),
+        ("services", cache.services_long_cache),
+        ("services_short", cache.services_short_cache),
+    ]:
+        services_cache.init_app(app, config={"CACHE_DIR": str(tmp_path / "cache" / name)})
+    with app.app_context():
+        yield app
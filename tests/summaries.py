@@ -0,0 +1,221 @@
+"""Synthetic datasets shaped like the ones of the services, the per group implementations of the summaries
+before they were vectorized and the credits aggregations answered from the rollup cube.
+Used by the tests and the benchmarks to compare the implementations"""
+import numpy as np
+import pandas as pd
+from src.apps.services import ALL_BRIDGES, ALL_TOKENS, Credits, DfCacheable
+from src.apps.services.credits import ROLLUP_DIMENSIONS
+
+POOL_COLUMNS = ["bct_quantity", "nct_quantity", "ubo_quantity", "nbo_quantity", "mco2_quantity"]
+# Date of the credits summed by the dated rollup cube
+ROLLUP_DATE_COLUMN = "bridged_date"
+
+
+def credits_df(rows: int, seed: int = 0) -> pd.DataFrame:
+    """Random credits shaped like the datasets of the credits service"""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "vintage": rng.integers(2000, 2023, rows),
+        "project_type": pd.Categorical(rng.choice([f"type {i}" for i in range(20)], rows)).as_ordered(),
+        "methodology": pd.Categorical(rng.choice([f"VM{i:04}" for i in range(60)], rows)).as_ordered(),
+        "country": pd.Categorical(rng.choice([f"country {i}" for i in range(80)], rows)).as_ordered(),
+        "bridge": pd.Categorical(rng.choice(["Toucan", "C3", "Moss", "Verra"], rows)).as_ordered(),
+        "quantity": rng.integers(1, 10000, rows).astype(float),
+        "bridged_date": pd.to_datetime(1609459200 + rng.integers(0, 800 * 86400, rows), unit="s", utc=True),
+    })
+    df["country_code"] = df["country"].cat.rename_categories(lambda country: country.replace("country ", "C"))
+    df["total_quantity"] = df["quantity"]
+    for column in POOL_COLUMNS:
+        df[column] = np.where(rng.random(rows) < 0.3, rng.random(rows) * df["quantity"], 0)
+    return df
+
+
+def credits_groupings(credits, df) -> dict:
+    """Functions returning the (grouped credits, kept fields) summarized by the credits aggregations, by name"""
+    daily_df = credits.date_manipulations(df.copy(), "bridged_date", "daily")
+    return {
+        "all": lambda: (df, []),
+        "vintage": lambda: (df.groupby("vintage", group_keys=False), "vintage"),
+        "project": lambda: (df.groupby("project_type", group_keys=False, observed=True), "project_type"),
+        "methodology": lambda: (df.groupby("methodology", group_keys=False, observed=True), "methodology"),
+        "country": lambda: (
+            df.groupby(["country", "country_code"], group_keys=False, observed=True),
+            ["country_code", "country"]
+        ),
+        "daily": lambda: (daily_df.groupby("bridged_date", group_keys=False, observed=True), "bridged_date"),
+    }
+
+
+def retirements_df(rows: int, seed: int = 0) -> pd.DataFrame:
+    """Random retirements shaped like the datasets of the retirements service"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "retirement_date": pd.to_datetime(1609459200 + rng.integers(0, 800 * 86400, rows), unit="s", utc=True),
+        "token": pd.Categorical(rng.choice([token.upper() for token in ALL_TOKENS] + ["OTHER"], rows)).as_ordered(),
+        "origin": pd.Categorical(rng.choice(["Offchain", "Klima"], rows)).as_ordered(),
+        "quantity": rng.random(rows) * 100,
+    })
+
+
+def tokens_df() -> pd.DataFrame:
+    """Tokens shaped like the tokens dataset"""
+    return pd.DataFrame({
+        "name": ["BCT", "NCT", "UBO", "NBO", "MCO2"],
+        "token_address": [f"0x{i:040x}" for i in range(1, 6)],
+        "chain": ["polygon", "polygon", "polygon", "polygon", "eth"],
+    })
+
+
+def pools_df(rows: int, addresses: list, seed: int = 0) -> pd.DataFrame:
+    """Random pools operations shaped like the datasets of the pools service"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "retirement_date": pd.to_datetime(1609459200 + rng.integers(0, 800 * 86400, rows), unit="s", utc=True),
+        "pool": pd.Categorical(rng.choice(addresses + ["0xother"], rows)),
+        "quantity": rng.random(rows) * 100,
+    })
+
+
+def legacy_pool_summary(df, kept_fields=[]):
+    """Credits.pool_summary before it was vectorized"""
+    if isinstance(df, pd.DataFrame):
+        df = df.groupby(lambda x: True, group_keys=False)
+
+    if not isinstance(kept_fields, list):
+        kept_fields = [kept_fields]
+
+    def summary(df):
+        res_df = pd.DataFrame()
+        for kept_field in kept_fields:
+            res_df[kept_field] = [df[kept_field].iloc[0]]
+
+        total_quantity = df["total_quantity"].sum()
+        res_df["total_quantity"] = [total_quantity]
+        not_pooled_quantity = total_quantity
+        for column in POOL_COLUMNS:
+            if column in df:
+                column_quantity = df[column].sum()
+                res_df[column] = [column_quantity]
+                not_pooled_quantity -= column_quantity
+        res_df["not_pooled_quantity"] = [not_pooled_quantity]
+
+        return res_df
+    return df.apply(summary).reset_index(drop=True)
+
+
+def legacy_bridge_summary(df, kept_fields):
+    """Credits.bridge_summary before it was vectorized"""
+    if isinstance(df, pd.DataFrame):
+        df = df.groupby(lambda x: True)
+
+    column = "quantity"
+    if not isinstance(kept_fields, list):
+        kept_fields = [kept_fields]
+
+    def summary(df):
+        res_df = pd.DataFrame()
+        for kept_field in kept_fields:
+            res_df[kept_field] = [df[kept_field].iloc[0]]
+        bridged_quantity = 0
+        for bridge in ALL_BRIDGES:
+            filtered_df = df[df["bridge"].str.lower() == bridge.lower()]
+            this_bridge_quantity = filtered_df[column].sum()
+            res_df[f"{bridge}_quantity"] = [this_bridge_quantity]
+            bridged_quantity = bridged_quantity + this_bridge_quantity
+        total_quantity = df[column].sum()
+        res_df["total_quantity"] = [total_quantity]
+        res_df["not_bridge_quantity"] = [total_quantity - bridged_quantity]
+        res_df["bridge_quantity"] = [bridged_quantity]
+        res_df["bridge_ratio"] = [bridged_quantity / total_quantity]
+        return res_df
+
+    return df.apply(summary).reset_index(drop=True)
+
+
+def legacy_token_summary(df):
+    """Retirements.token_summary before it was vectorized"""
+    def summary(df):
+        res_df = pd.DataFrame()
+        res_df["retirement_date"] = [df["retirement_date"].iloc[0]]
+        res_df["amount_retired"] = [df["quantity"].sum()]
+        res_df["number_of_retirements"] = [df["quantity"].count()]
+        for token in ALL_TOKENS:
+            filtered_df = df[df["token"] == token.upper()]
+            res_df[f"amount_retired_{token}"] = [filtered_df["quantity"].sum()]
+            res_df[f"number_of_retirements_{token}"] = [filtered_df["quantity"].count()]
+        return res_df
+
+    return df.apply(summary).reset_index(drop=True)
+
+
+def legacy_origin_summary(df):
+    """Retirements.origin_summary before it was vectorized"""
+    def summary(df):
+        res_df = pd.DataFrame()
+        res_df["retirement_date"] = [df["retirement_date"].iloc[0]]
+        for origin in ["Offchain", "Klima"]:
+            filtered_df = df[df["origin"] == origin]
+            res_df[f"amount_retired_{origin.lower()}"] = [filtered_df["quantity"].sum()]
+            res_df[f"number_of_retirements_{origin.lower()}"] = [filtered_df["quantity"].count()]
+
+        return res_df
+
+    return df.apply(summary).reset_index(drop=True)
+
+
+def legacy_pools_summary(df, date_field, tokens):
+    """Pools.pool_summary before it was vectorized. tokens is Tokens().get_dict()"""
+
+    def summary(df):
+        res_df = pd.DataFrame()
+        res_df[date_field] = [df[date_field].iloc[0]]
+        for token in tokens:
+            address = tokens[token]["token_address"]
+            filtered_df = df[df["pool"] == address]
+            res_df[f"{token.lower()}_quantity"] = [filtered_df["quantity"].sum()]
+            res_df[f"{token.lower()}_count"] = [filtered_df["quantity"].count()]
+        return res_df
+
+    return df.apply(summary).reset_index(drop=True)
+
+
+def projects_credits_df(rows: int, projects: int, seed: int = 0):
+    """Random credits of a number of projects: the rollup dimensions are the ones of their project"""
+    df = credits_df(rows, seed)
+    projects_df = credits_df(projects, seed + 1)
+    index = np.random.default_rng(seed).integers(0, projects, rows)
+    for dimension in ROLLUP_DIMENSIONS:
+        df[dimension] = projects_df[dimension].take(index).values
+    return df
+
+
+def rollup_aggregations(credits: Credits):
+    """Yields (name, aggregation of the credits, aggregation of the cube, uses the dated cube)"""
+    for name, groupby, keys in [
+        ("country", Credits.countries_agg, ["country", "country_code"]),
+        ("project", Credits.projects_agg, ["project_type"]),
+        ("methodology", Credits.methodologies_agg, ["methodology"]),
+        ("vintage", Credits.vintage_agg, ["vintage"]),
+    ]:
+        yield (
+            name,
+            lambda df, groupby=groupby: DfCacheable.sum.func(credits, groupby.func(credits, df), "quantity"),
+            lambda cube, keys=keys: credits.rollup_sum(cube, keys),
+            False,
+        )
+    for freq in ["daily", "monthly"]:
+        yield (
+            freq,
+            lambda df, freq=freq: DfCacheable.sum.func(
+                credits, DfCacheable.date_agg.func(credits, df, ROLLUP_DATE_COLUMN, freq), "quantity"
+            ),
+            lambda cube, freq=freq: credits.rollup_sum(cube, [ROLLUP_DATE_COLUMN], ROLLUP_DATE_COLUMN, freq),
+            True,
+        )
+
+
+def compare(expected: pd.DataFrame, actual: pd.DataFrame):
+    """Results must have the same rows, columns and values. Categories are compared as values"""
+    def values(df):
+        return df.apply(lambda column: column.astype(object) if column.dtype == "category" else column)
+    pd.testing.assert_frame_equal(values(expected), values(actual), check_dtype=False, check_exact=False, rtol=1e-9)
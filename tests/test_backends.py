@@ -0,0 +1,118 @@
+import pickle
+import numpy as np
+import pandas as pd
+from flask_caching.backends import filesystemcache
+from src.apps.services import backends
+from src.apps.services.backends import (
+    ArrowFileSystemCache, TieredFileSystemCache, SharedRedisCache, SqliteCache, BUFFER_ALIGNMENT
+)
+
+
+def test_tiered_cache_does_not_report_expired_memory_entries(tmp_path, monkeypatch):
+    cache = TieredFileSystemCache(str(tmp_path), threshold=0)
+    cache.set("key", pd.DataFrame({"quantity": [1.0, 2.0]}), timeout=60)
+    assert cache.has("key") and cache.is_stored("key")
+
+    now = backends.time()
+    monkeypatch.setattr(backends, "time", lambda: now + 120)
+    monkeypatch.setattr(filesystemcache, "time", lambda: now + 120)
+    assert not cache.memory.contains("key")
+    assert not cache.has("key")
+    assert cache.get("key") is None
+
+
+def test_tiered_cache_sizes_other_values_with_their_file(tmp_path):
+    cache = TieredFileSystemCache(str(tmp_path), threshold=0)
+    layout = {"items": [{"date": "2022-01-01", "quantity": i} for i in range(100)]}
+    cache.set("layout", layout)
+    assert cache.memory.size == cache.file_size(cache._get_filename("layout"))
+
+    # Promoted from the file system with the same size
+    cache.memory.clear()
+    assert cache.get("layout") == layout
+    assert cache.memory.size == cache.file_size(cache._get_filename("layout"))
+
+
+def test_pinned_values_are_bounded_by_their_own_budget(tmp_path, monkeypatch):
+    value = b"0" * 1000
+    cache = TieredFileSystemCache(str(tmp_path), threshold=0, max_size=10000)
+    for i in range(20):
+        cache.set_pinned(f"dataset{i}", value)
+    # Pinned values over their budget are removed like the others
+    assert cache.usage()["size"] <= cache.max_size
+    # The most recently written values are kept
+    assert cache.get("dataset19") == value
+
+    # Files are opened once to know if they are pinned
+    opened = []
+    monkeypatch.setattr(backends, "open", lambda *args: opened.append(args) or open(*args), raising=False)
+    cache.enforce_budget()
+    assert opened == []
+
+
+def test_shared_redis_cache_reads_back_integers_and_values():
+    # The serialization does not need a server
+    cache = SharedRedisCache.__new__(SharedRedisCache)
+    df = pd.DataFrame({"quantity": [1.0, 2.0]})
+    for value in [5, 512, -5, 0, "5", b"5", {"count": 5}]:
+        assert cache.load_object(cache.dump_object(value)) == value
+    pd.testing.assert_frame_equal(cache.load_object(cache.dump_object(df)), df)
+    # Values written by the RedisCache are still read
+    assert cache.load_object(b"!" + pickle.dumps([1, 2])) == [1, 2]
+    # Truncated values and values in an unknown format are misses
+    assert cache.load_object(cache.dump_object(df)[:3]) is None
+    assert cache.load_object(b"5" + pickle.dumps(df)) is None
+
+
+def test_sqlite_cache_stores_shared_values(tmp_path, monkeypatch):
+    cache = SqliteCache(str(tmp_path), threshold=3)
+    df = pd.DataFrame({"quantity": [1.0, 2.0]})
+    cache.set("count", 5)
+    cache.set("df", df, timeout=60)
+    assert cache.get("count") == 5
+    pd.testing.assert_frame_equal(cache.get("df"), df)
+    assert not cache.add("count", 512)
+    assert cache.get_first(["missing", "count", "df"]) == (1, 5)
+
+    # Expired entries are misses and can be added again
+    now = backends.time()
+    monkeypatch.setattr(backends, "time", lambda: now + 120)
+    assert cache.get("df") is None and not cache.has("df")
+    assert cache.add("df", 512)
+    assert cache.get("df") == 512
+
+    # The least recently written entries are removed over the threshold
+    cache.set("other", "value")
+    cache.set("another", "value")
+    assert cache.get("count") is None
+    assert cache.stats()["entries"] == 3
+
+
+def test_usage_is_counted_without_scanning(tmp_path, monkeypatch):
+    cache = TieredFileSystemCache(str(tmp_path), threshold=0, max_size=10 ** 6)
+    cache.set("first", b"0" * 1000)
+    cache.set("second", b"0" * 1000)
+    cache.set("second", b"0" * 2000)
+    cache.delete("first")
+    usage = cache.usage()
+
+    monkeypatch.setattr(backends.os, "scandir", None)
+    assert cache.usage() == usage
+    monkeypatch.undo()
+    cache.enforce_budget()
+    assert {key: cache.usage()[key] for key in ["size", "entries"]} == {
+        key: usage[key] for key in ["size", "entries"]
+    }
+
+
+def test_pickled_buffers_are_aligned_in_memory(tmp_path):
+    cache = ArrowFileSystemCache(str(tmp_path), threshold=0)
+    df = pd.DataFrame({"quantity": np.arange(1000, dtype=float), "count": np.arange(1000)})
+    for timeout in [0, 60, 3600 * 24 * 365]:
+        cache.set("df", df, timeout=timeout)
+        cache.set("array", np.arange(999, dtype=np.int8), timeout=timeout)
+        value = cache.get("df")
+        pd.testing.assert_frame_equal(value, df)
+        for column in value.columns:
+            assert value[column].values.ctypes.data % BUFFER_ALIGNMENT == 0
+        assert cache.get("array").ctypes.data % BUFFER_ALIGNMENT == 0
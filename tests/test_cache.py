@@ -0,0 +1,65 @@
+from src.apps.services import cache
+from src.apps.services.cache import KeyCacheable, load_cached_command, final_cached_command, fresh_key
+
+
+class Numbers(KeyCacheable):
+    """A service whose results are served stale-while-revalidate"""
+    stale_timeout = 600
+
+    def __init__(self, commands=[], cache=cache.services_short_cache):
+        super(Numbers, self).__init__(commands, cache)
+
+    @load_cached_command()
+    def load(self, _df, value):
+        return value
+
+    @final_cached_command()
+    def add(self, value, n):
+        return value + n
+
+
+def expire(*adds):
+    """Expires the cached results of the numbers loaded from 1, and of the additions to them.
+    They are only served while recomputed"""
+    service = Numbers().load(1)
+    for n in adds:
+        service.add_command(True, True, Numbers.add.func, n)
+    for command in service.plan():
+        service.cache.cache.delete(fresh_key(command["hash"]))
+
+
+def test_results_computed_from_stale_results_are_not_cached(services_app, monkeypatch):
+    revalidated = []
+    monkeypatch.setattr(KeyCacheable, "revalidate", lambda self, plan: revalidated.append(plan[-1]["key"]))
+
+    assert Numbers().load(1).add(1) == 2
+    expire()
+
+    service = Numbers().load(1)
+    assert service.add(2) == 3
+    assert set(revalidated) == {service.plan()[-1]["key"]}
+    backend = cache.services_short_cache.cache
+    assert not backend.has(service.commands[-1]["hash"])
+    assert not backend.has(fresh_key(service.commands[-1]["hash"]))
+
+
+def test_responses_built_from_stale_results_are_not_cached(services_app, monkeypatch):
+    monkeypatch.setattr(KeyCacheable, "revalidate", lambda self, plan: None)
+    calls = []
+
+    @services_app.route("/numbers")
+    @cache.services_short_cache.cached(key_prefix="numbers")
+    def numbers():
+        calls.append(1)
+        return {"value": Numbers().load(1).add(1)}
+
+    client = services_app.test_client()
+    assert client.get("/numbers").json == {"value": 2}
+    assert client.get("/numbers").json == {"value": 2}
+    assert len(calls) == 1
+
+    cache.services_short_cache.delete("numbers")
+    expire(1)
+    for _ in range(2):
+        assert client.get("/numbers").json == {"value": 2}
+    assert len(calls) == 3
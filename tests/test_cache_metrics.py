@@ -0,0 +1,59 @@
+import sys
+import json
+from flask_restful import Api
+from src.apps.api.endpoints import cache_metrics as endpoint
+from src.apps.api.endpoints.cache_metrics import CacheMetrics
+from src.apps.services import layout_cache, cache_metrics
+
+
+def test_endpoint_cache_hits_and_misses_are_recorded(services_app):
+    calls = []
+
+    @services_app.route("/view")
+    @layout_cache.cached(key_prefix="metered_view")
+    def metered_view():
+        calls.append(1)
+        return {"calls": len(calls)}
+
+    client = services_app.test_client()
+    for _ in range(3):
+        assert client.get("/view").json == {"calls": 1}
+
+    metrics = [
+        metrics for metrics in cache_metrics.snapshot()
+        if metrics["service"] == "endpoint" and metrics["command"] == "metered_view"
+    ]
+    assert len(metrics) == 1
+    assert (metrics[0]["hits"], metrics[0]["misses"]) == (2, 1)
+    assert metrics[0]["compute_time"]["count"] == 1
+
+
+def internal_client(app):
+    api = Api(app)
+    api.add_resource(CacheMetrics, "/internal/cache")
+    return app.test_client()
+
+
+def test_internal_endpoint_is_disabled_in_production_without_token(services_app, monkeypatch):
+    client = internal_client(services_app)
+    assert client.get("/internal/cache").status_code == 200
+    monkeypatch.setenv("ENV", "Production")
+    assert client.get("/internal/cache").status_code == 404
+
+
+def test_internal_endpoint_requires_the_token(services_app, monkeypatch):
+    monkeypatch.setattr(endpoint, "INTERNAL_TOKEN", "secret")
+    client = internal_client(services_app)
+    assert client.get("/internal/cache").status_code == 403
+    assert client.get("/internal/cache", headers={"Authorization": "Bearer other"}).status_code == 403
+    response = client.get("/internal/cache", headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 200
+    assert set(response.json) == {"commands", "caches", "warmer"}
+
+
+def test_log_lines_are_written_in_production(monkeypatch, capsys):
+    monkeypatch.setenv("ENV", "Production")
+    # The module is shadowed by the metrics in the services package
+    monkeypatch.setattr(sys.modules["src.apps.services.cache_metrics"], "CACHE_METRICS_LOG", True)
+    cache_metrics.log({"service": "Credits"})
+    assert json.loads(capsys.readouterr().out) == {"event": "cache", "service": "Credits"}
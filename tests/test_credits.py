@@ -0,0 +1,32 @@
+import pytest
+from src.apps.services import Credits
+from .summaries import (
+    credits_df, credits_groupings, projects_credits_df, rollup_aggregations, compare,
+    legacy_pool_summary, legacy_bridge_summary, ROLLUP_DATE_COLUMN
+)
+
+ROWS = 300
+
+
+@pytest.mark.parametrize("grouping", ["all", "vintage", "project", "methodology", "country", "daily"])
+def test_pool_summary_matches_the_per_group_summary(grouping):
+    credits = Credits()
+    df, kept_fields = credits_groupings(credits, credits_df(ROWS))[grouping]()
+    compare(legacy_pool_summary(df, kept_fields), Credits.pool_summary.func(credits, df, kept_fields))
+
+
+@pytest.mark.parametrize("grouping", ["all", "vintage", "project", "methodology", "country", "daily"])
+def test_bridge_summary_matches_the_per_group_summary(grouping):
+    credits = Credits()
+    df, kept_fields = credits_groupings(credits, credits_df(ROWS))[grouping]()
+    # The bridge summary of all the credits keeps their quantity
+    kept_fields = "quantity" if grouping == "all" else kept_fields
+    compare(legacy_bridge_summary(df, kept_fields), Credits.bridge_summary.func(credits, df, kept_fields))
+
+
+def test_rollup_aggregations_match_the_credits_ones():
+    credits = Credits()
+    df = projects_credits_df(ROWS, 20)
+    cubes = {dated: credits.rollup(df, ROLLUP_DATE_COLUMN if dated else None) for dated in [False, True]}
+    for name, aggregate, aggregate_cube, dated in rollup_aggregations(credits):
+        compare(aggregate(df.copy()), aggregate_cube(cubes[dated].copy()))
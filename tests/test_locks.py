@@ -0,0 +1,34 @@
+import os
+import threading
+from src.apps.services import locks
+from src.apps.services.locks import KeyLocks
+
+
+def test_file_locks_use_a_fixed_number_of_files(tmp_path):
+    key_locks = KeyLocks(file_locks=True)
+    directory = str(tmp_path / "services")
+    for i in range(500):
+        with key_locks.hold(f"key {i}", directory):
+            pass
+    assert 0 < len(os.listdir(tmp_path / "locks")) <= locks.FILE_LOCKS_COUNT
+
+
+def test_nested_keys_sharing_a_lock_file_do_not_deadlock(tmp_path, monkeypatch):
+    monkeypatch.setattr(locks, "FILE_LOCKS_COUNT", 1)
+    key_locks = KeyLocks(file_locks=True)
+    directory = str(tmp_path / "services")
+    done = []
+
+    def compute():
+        # A result computed from another cached result
+        with key_locks.hold("summary", directory):
+            with key_locks.hold("dataset", directory):
+                done.append(threading.current_thread().name)
+
+    threads = [threading.Thread(target=compute, name=f"thread {i}") for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert sorted(done) == [f"thread {i}" for i in range(4)]
+    assert key_locks.locks == {}
@@ -0,0 +1,37 @@
+import pytest
+from src.apps.services import Pools, services_short_cache
+from .conftest import write_dataset
+from .summaries import tokens_df, pools_df, legacy_pools_summary, compare
+
+ROWS = 300
+
+
+@pytest.fixture
+def tokens(services_app, lake):
+    """The tokens of the storage, like Tokens().get_dict()"""
+    write_dataset(lake, "tokens_data_v2", tokens_df())
+    return tokens_df().set_index("name").transpose().to_dict(orient="dict")
+
+
+def pools_by_date(tokens, freq):
+    pools = Pools()
+    addresses = [token["token_address"] for token in tokens.values()]
+    df = pools.date_manipulations(pools_df(ROWS, addresses), "retirement_date", freq)
+    return pools, df.groupby("retirement_date", group_keys=False, observed=True)
+
+
+@pytest.mark.parametrize("freq", ["daily", "monthly"])
+def test_pool_summary_matches_the_per_group_summary(tokens, freq):
+    pools, df = pools_by_date(tokens, freq)
+    compare(legacy_pools_summary(df, "retirement_date", tokens), Pools.pool_summary.func(pools, df, "retirement_date"))
+
+
+def test_tokens_addresses_are_computed_once_per_generation(tokens, loads):
+    pools, df = pools_by_date(tokens, "monthly")
+    Pools.pool_summary.func(pools, df, "retirement_date")
+    assert loads == [("tokens_data_v2", None)]
+
+    # The short services cache expired
+    services_short_cache.clear()
+    Pools.pool_summary.func(pools, df, "retirement_date")
+    assert loads == [("tokens_data_v2", None)]
@@ -0,0 +1,33 @@
+import pytest
+from src.apps.services import Retirements
+from .summaries import retirements_df, legacy_token_summary, legacy_origin_summary, compare
+
+ROWS = 300
+
+
+def retirements_by_date(freq):
+    retirements = Retirements()
+    df = retirements.date_manipulations(retirements_df(ROWS), "retirement_date", freq)
+    return retirements, df.groupby(["retirement_date"], group_keys=False, observed=True)
+
+
+@pytest.mark.parametrize("freq", ["daily", "monthly"])
+def test_token_summary_matches_the_per_group_summary(freq):
+    retirements, df = retirements_by_date(freq)
+    compare(legacy_token_summary(df), Retirements.token_summary.func(retirements, df))
+
+
+@pytest.mark.parametrize("freq", ["daily", "monthly"])
+def test_origin_summary_matches_the_per_group_summary(freq):
+    retirements, df = retirements_by_date(freq)
+    compare(legacy_origin_summary(df), Retirements.origin_summary.func(retirements, df))
+
+
+def test_token_summary_of_a_subset_of_the_tokens():
+    retirements, df = retirements_by_date("monthly")
+    expected = legacy_token_summary(df)
+    expected = expected[[
+        column for column in expected.columns
+        if not column.endswith(("_ubo", "_nbo", "_mco2"))
+    ]]
+    compare(expected, Retirements.token_summary.func(retirements, df, ["nct", "bct"]))
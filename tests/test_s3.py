@@ -0,0 +1,56 @@
+import pandas as pd
+from src.apps.services import S3, services_short_cache
+from src.apps.services.versions import dataset_versions
+from .conftest import write_dataset
+
+
+def prices_df(price: float):
+    return pd.DataFrame({
+        "date": pd.date_range("2022-01-01", periods=3, freq="D", tz="UTC"),
+        "bct_price": [price] * 3,
+        "bct_address": ["0xbct"] * 3,
+    })
+
+
+def test_refresh_loads_the_projections_used_by_the_services(services_app, lake, loads):
+    write_dataset(lake, "assets_prices", prices_df(1))
+    S3().load("assets_prices", ["date", "bct_price"])
+    assert loads == [("assets_prices", ["date", "bct_price"])]
+
+    write_dataset(lake, "assets_prices", prices_df(2))
+    S3.refresh(services_app, {"assets_prices": "v2"})
+    # Only the projection is loaded: the full dataset was never requested
+    assert loads[1:] == [("assets_prices", ["date", "bct_price"])]
+
+    df = S3().load("assets_prices", ["date", "bct_price"])
+    assert len(loads) == 2
+    assert list(df.columns) == ["date", "bct_price"]
+    assert (df["bct_price"] == 2).all()
+    assert dataset_versions.versions["assets_prices"] == "v2"
+
+
+def requests_loads(app, slug, cache=None):
+    """Loads a dataset in two successive requests"""
+    dataset_versions.init_app(app)
+
+    @app.route("/load")
+    def load():
+        s3 = S3(cache=cache) if cache else S3()
+        return {"rows": len(s3.load(slug))}
+
+    client = app.test_client()
+    for _ in range(2):
+        assert client.get("/load").json == {"rows": 3}
+
+
+def test_unversioned_datasets_stay_cached_between_requests(services_app, lake, loads):
+    write_dataset(lake, "current_assets_prices", prices_df(1))
+    requests_loads(services_app, "current_assets_prices", services_short_cache)
+    assert loads == [("current_assets_prices", None)]
+
+
+def test_datasets_stay_cached_between_requests_without_versioning(services_app, lake, loads, monkeypatch):
+    monkeypatch.setattr(dataset_versions, "enabled", False)
+    write_dataset(lake, "assets_prices", prices_df(1))
+    requests_loads(services_app, "assets_prices")
+    assert loads == [("assets_prices", None)]
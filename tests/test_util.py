@@ -0,0 +1,135 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import pytest
+from botocore.exceptions import ClientError
+from prefect.results import PersistedResultBlob
+from src import util
+from src.util import (
+    BlockRegistry, ArrowSerializer, DfSerializer, loads_dataset, load_local_data, read_arrow_file, write_arrow_file
+)
+
+
+def sample_df():
+    return pd.DataFrame({"token": ["BCT", "NCT", "BCT"], "quantity": [1.5, 2.0, 3.25]})
+
+
+def test_loads_dataset_reads_raw_arrow_files():
+    df = sample_df()
+    for compression in ["zstd", "lz4", "uncompressed"]:
+        file_data = ArrowSerializer(compression).dumps(df)
+        pd.testing.assert_frame_equal(loads_dataset(file_data), df)
+        pd.testing.assert_frame_equal(loads_dataset(file_data, ["quantity"]), df[["quantity"]])
+
+
+def test_loads_dataset_reads_feather_result_blobs():
+    df = sample_df()
+    serializer = DfSerializer()
+    file_data = PersistedResultBlob(serializer=serializer, data=serializer.dumps(df)).to_bytes()
+    pd.testing.assert_frame_equal(loads_dataset(file_data), df)
+    pd.testing.assert_frame_equal(loads_dataset(file_data, ["token"]), df[["token"]])
+
+
+def test_load_local_data_returns_writable_frames(tmp_path):
+    df = sample_df()
+    serializer = DfSerializer()
+    blob = PersistedResultBlob(serializer=serializer, data=serializer.dumps(df)).to_bytes()
+    (tmp_path / "tokens-latest").write_bytes(blob)
+
+    # Converted to an Arrow file on first load, then read from it
+    for _ in range(2):
+        loaded = load_local_data(str(tmp_path), "tokens")
+        pd.testing.assert_frame_equal(loaded, df)
+        loaded.loc[0, "quantity"] = 10
+        loaded["quantity"].fillna(0, inplace=True)
+    assert (tmp_path / "tokens-latest.arrow").exists()
+    pd.testing.assert_frame_equal(load_local_data(str(tmp_path), "tokens", ["quantity"]), df[["quantity"]])
+
+
+def test_concurrent_arrow_file_writes_replace_the_file_atomically(tmp_path):
+    filename = str(tmp_path / "dataset-latest.arrow")
+    frames = [pd.DataFrame({"quantity": [float(i)] * 1000000}) for i in range(16)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(write_arrow_file, frames, [filename] * len(frames)))
+
+    df = read_arrow_file(filename)
+    assert len(df) == 1000000 and df["quantity"].nunique() == 1
+    assert os.listdir(tmp_path) == ["dataset-latest.arrow"]
+
+
+class FakeBlock():
+    """A storage block whose reads fail with error_code, if set"""
+    def __init__(self, name, error_code=None):
+        self.name = name
+        self.error_code = error_code
+
+    def read_path(self, path):
+        if self.error_code:
+            raise ClientError({"Error": {"Code": self.error_code}}, "GetObject")
+        return f"{self.name}/{path}".encode()
+
+
+class FakeLoader():
+    """Loads blocks. Reads of the first one fail with first_error_code, if set"""
+    def __init__(self, first_error_code=None):
+        self.loads = []
+        self.first_error_code = first_error_code
+
+    def __call__(self, block_name):
+        self.loads.append(block_name)
+        return FakeBlock(block_name, self.first_error_code if len(self.loads) == 1 else None)
+
+
+def test_block_registry_reloads_blocks_with_rejected_credentials():
+    loader = FakeLoader("ExpiredToken")
+    registry = BlockRegistry(loader=loader)
+    assert registry.read_path("dev", "tokens") == b"dev/tokens"
+    assert registry.read_path("dev", "prices") == b"dev/prices"
+    assert loader.loads == ["dev", "dev"]
+
+
+def test_block_registry_does_not_retry_other_errors():
+    loader = FakeLoader("NoSuchKey")
+    registry = BlockRegistry(loader=loader)
+    with pytest.raises(ClientError):
+        registry.read_path("dev", "tokens")
+    assert loader.loads == ["dev"]
+
+
+def test_block_registry_reloads_blocks_older_than_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(util.time, "monotonic", lambda: now[0])
+    loader = FakeLoader()
+    registry = BlockRegistry(loader=loader, ttl=60)
+    first = registry.get_block("dev")
+    now[0] += 30
+    assert registry.get_block("dev") is first
+    now[0] += 60
+    assert registry.get_block("dev") is not first
+    assert loader.loads == ["dev", "dev"]
+
+
+def test_block_registry_loads_blocks_concurrently():
+    slow_started, release = threading.Event(), threading.Event()
+    loads = []
+
+    def loader(block_name):
+        loads.append(block_name)
+        if block_name == "slow":
+            slow_started.set()
+            release.wait(10)
+        return FakeBlock(block_name)
+
+    registry = BlockRegistry(loader=loader)
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        slow = [executor.submit(registry.get_block, "slow") for _ in range(2)]
+        try:
+            assert slow_started.wait(10)
+            # Other blocks are not blocked by the slow load
+            assert executor.submit(registry.get_block, "fast").result(timeout=2).name == "fast"
+        finally:
+            release.set()
+        assert [future.result().name for future in slow] == ["slow", "slow"]
+    # Loaded once by the first caller
+    assert sorted(loads) == ["fast", "slow"]
@@ -0,0 +1,50 @@
+from src.apps.services import versions
+from src.apps.services.versions import DatasetVersions
+
+
+class RecordingCache():
+    """Records the deleted keys, and if the versions lock was held"""
+    def __init__(self, dataset_versions):
+        self.dataset_versions = dataset_versions
+        self.deleted = []
+
+    def delete(self, key):
+        self.deleted.append((key, self.dataset_versions.lock.locked()))
+
+
+def test_versions_that_cannot_be_fetched_are_unversioned(monkeypatch):
+    def failing_dataset_version(slug):
+        raise ConnectionError("storage unavailable")
+
+    monkeypatch.setattr(versions, "dataset_version", failing_dataset_version)
+    dataset_versions = DatasetVersions(["prices"])
+    assert dataset_versions.get("prices") is None
+    assert dataset_versions.versions == {}
+
+
+def test_evicted_entries_are_deleted_without_holding_the_lock():
+    dataset_versions = DatasetVersions(["prices"])
+    cache = RecordingCache(dataset_versions)
+    dataset_versions.publish({"prices": "v1"})
+    snapshot = dataset_versions.pin()
+    dataset_versions.track(("prices", "v1"), cache, "v1 entry")
+    dataset_versions.track(snapshot.generation, cache, "generation entry")
+
+    dataset_versions.publish({"prices": "v2"})
+    # Still used by the pinned snapshot
+    assert cache.deleted == []
+    dataset_versions.unpin(snapshot)
+    assert sorted(cache.deleted) == [("generation entry", False), ("v1 entry", False)]
+    assert dataset_versions.tracked == {}
+
+
+def test_tracked_entries_are_bounded(monkeypatch):
+    monkeypatch.setattr(versions, "MAX_TRACKED_ENTRIES", 3)
+    dataset_versions = DatasetVersions(["prices"])
+    cache = RecordingCache(dataset_versions)
+    dataset_versions.publish({"prices": "v1"})
+    for i in range(5):
+        dataset_versions.track(("prices", "v1"), cache, f"entry {i}")
+    # Tracked again: it is the most recent one
+    dataset_versions.track(("prices", "v1"), cache, "entry 2")
+    assert [hash for _cache, hash in dataset_versions.tracked[("prices", "v1")]] == ["entry 3", "entry 4", "entry 2"]
@@ -0,0 +1,62 @@
+from flask import Flask, abort, request
+from src.apps.api.warmer import CacheWarmer
+
+
+def api_app():
+    """An application with a few routes shaped like the API ones"""
+    app = Flask(__name__)
+    for rule in [
+        "/api/v1/credits/raw",
+        "/api/v1/credits/agg/country",
+        "/api/v1/credits/agg/bridge/country",
+        "/api/v1/pools/agg/<string:freq>",
+        "/api/v1/holders",
+    ]:
+        app.add_url_rule(rule, rule, lambda **_kwargs: {})
+    return app
+
+
+def test_warmer_only_warms_aggregations_with_the_parameters_they_use(tmp_path):
+    warmer = CacheWarmer(enabled=False, lock_file=str(tmp_path / "warmer.lock"))
+    warmer.init_app(api_app())
+    urls = warmer.urls()
+
+    assert urls[:4] == [
+        "/api/v1/credits/agg/bridge/country",
+        "/api/v1/credits/agg/country",
+        "/api/v1/pools/agg/daily",
+        "/api/v1/pools/agg/monthly",
+    ]
+    assert not [url for url in urls if "/raw" in url or "/holders" in url]
+    # Bridges aggregations always use the offchain credits
+    assert not [url for url in urls if url.startswith("/api/v1/credits/agg/bridge/country?bridge=")]
+    assert "/api/v1/credits/agg/bridge/country?status=issued" in urls
+    # Rejected and default statuses are not warmed
+    assert "/api/v1/credits/agg/country?bridge=offchain&status=issued" in urls
+    assert "/api/v1/credits/agg/country?bridge=toucan&status=issued" not in urls
+    assert not [url for url in urls if "status=all&" in url or url.endswith("status=all")]
+
+
+def test_warmer_runs_in_a_single_process(tmp_path):
+    lock_file = str(tmp_path / "warmer.lock")
+    first, second = CacheWarmer(lock_file=lock_file), CacheWarmer(lock_file=lock_file)
+    assert first.elect()
+    assert not second.elect()
+    assert second.status()["state"] == "other process"
+
+
+def test_live_requests_are_not_uncounted_when_an_earlier_handler_aborts(tmp_path):
+    app = api_app()
+
+    @app.before_request
+    def deny_holders():
+        if request.path == "/api/v1/holders":
+            abort(403)
+
+    warmer = CacheWarmer(enabled=False, lock_file=str(tmp_path / "warmer.lock"))
+    warmer.init_app(app)
+    client = app.test_client()
+    assert client.get("/api/v1/holders").status_code == 403
+    assert warmer.live_requests == 0
+    assert client.get("/api/v1/credits/agg/country").status_code == 200
+    assert warmer.live_requests == 0